@@ -1,7 +1,26 @@
 # admin.py - Fixed
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from .models import *
+from . import order_export, rollups
+
+
+class EstimatedCountPaginator(Paginator):
+    """For append-only tables: an unfiltered changelist takes its count from
+    MAX(id), an index lookup, instead of COUNT(*) over every row."""
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if query.where:
+            return super().count
+        return self.object_list.model.objects.aggregate(n=Max('pk'))['n'] or 0
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -13,13 +32,15 @@ class CategoryAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'actual_price', 'special_price', 'stock', 'sales_count', 'is_active', 'is_featured']
     list_filter = ['category', 'is_active', 'is_featured', 'created_at']
-    search_fields = ['name', 'description']
+    list_select_related = ['category']
+    search_fields = ['name', 'sku', 'description']
     readonly_fields = ['created_at', 'updated_at']
 
 @admin.register(Slider)
 class SliderAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
+    list_select_related = ['category']
     search_fields = ['title', 'description']
 
 @admin.register(SpecialOffer)
@@ -32,6 +53,7 @@ class SpecialOfferAdmin(admin.ModelAdmin):
 class ShippingAddressAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'user', 'city', 'state', 'pincode', 'created_at']
     list_filter = ['city', 'state', 'created_at']
+    list_select_related = ['user']
     search_fields = ['full_name', 'user__username', 'city']
     readonly_fields = ['created_at']
 
@@ -49,6 +71,8 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_id', 'user', 'total_amount', 'status', 'created_at', 'shipping_address_display']
     list_filter = ['status', 'created_at']
+    list_select_related = ['user', 'shipping_address']
+    show_full_result_count = False
     search_fields = ['user__username', 'order_id', 'shipping_address__full_name']
     readonly_fields = ['created_at', 'updated_at', 'order_id']
     inlines = [OrderItemInline]
@@ -59,18 +83,55 @@ class OrderAdmin(admin.ModelAdmin):
         return "No shipping address"
     shipping_address_display.short_description = 'Shipping Address'
 
+    def _export(self, queryset, fmt):
+        # Streamed as it is generated; nothing is rendered in memory first
+        response = StreamingHttpResponse(order_export.iter_export(queryset, fmt),
+                                         content_type=order_export.CONTENT_TYPES[fmt])
+        filename = f'orders-{timezone.localdate():%Y%m%d}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def export_csv(self, request, queryset):
+        return self._export(queryset, 'csv')
+    export_csv.short_description = 'Export selected orders as CSV'
+
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, 'jsonl')
+    export_jsonl.short_description = 'Export selected orders as JSONL'
+
+    actions = [export_csv, export_jsonl]
+
 @admin.register(OrderFeedback)
 class OrderFeedbackAdmin(admin.ModelAdmin):
     list_display = ['order', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
+    list_select_related = ['order__user']
     readonly_fields = ['created_at']
 
 @admin.register(UserLoginHistory)
 class UserLoginHistoryAdmin(admin.ModelAdmin):
     list_display = ['user', 'login_time', 'ip_address', 'device_id']
     list_filter = ['login_time']
-    search_fields = ['user__username', 'ip_address']
+    list_select_related = ()  # False would still join auth_user for the user column
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    search_fields = ['ip_address', 'device_id']
     readonly_fields = ['login_time']
+    
+    # Users are in the main database, so no join: prefetch them per page
+    # and resolve username searches there
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('user')
+    
+    def get_search_results(self, request, queryset, search_term):
+        # `queryset` already has the list filters applied; the username
+        # matches must keep them too
+        filtered = queryset
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            user_ids = list(User.objects.filter(username__icontains=search_term).values_list('pk', flat=True)[:1000])
+            queryset |= filtered.filter(user_id__in=user_ids)
+        return queryset, may_have_duplicates
 
 @admin.register(AboutUs)
 class AboutUsAdmin(admin.ModelAdmin):
@@ -97,6 +158,34 @@ class EventAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'event_date', 'created_at']
     search_fields = ['title', 'description']
 
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """Sales dashboard - reads only the rollup tables, never Order/OrderItem."""
+    change_list_template = 'admin/vastramapp/dailysales/change_list.html'
+    list_display = ['date', 'order_count', 'units', 'revenue']
+    date_hierarchy = 'date'
+    DAY_CHOICES = [7, 30, 90, 365]
+    
+    def changelist_view(self, request, extra_context=None):
+        # `days` is ours, not a changelist filter
+        request.GET = request.GET.copy()
+        try:
+            days = int(request.GET.pop('days', [30])[0])
+        except ValueError:
+            days = 30
+        days = days if days in self.DAY_CHOICES else 30
+        extra_context = {**(extra_context or {}), **rollups.dashboard_data(days), 'day_choices': self.DAY_CHOICES}
+        return super().changelist_view(request, extra_context=extra_context)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Custom User Admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
@@ -108,17 +197,36 @@ class UserLoginHistoryInline(admin.TabularInline):
     can_delete = False
     max_num = 5  # Show only last 5 logins
 
+class UserChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Login history is in the logs database, so it can't be a subquery;
+        # one grouped query covers the whole page instead
+        users = list(self.result_list)
+        stats = {
+            row['user_id']: row
+            for row in UserLoginHistory.objects.filter(user_id__in=[u.pk for u in users])
+            .values('user_id').annotate(last=Max('login_time'), total=Count('id')).order_by()
+        }
+        for user in users:
+            row = stats.get(user.pk, {})
+            user.last_login_time = row.get('last')
+            user.login_total = row.get('total', 0)
+
 class UserAdmin(BaseUserAdmin):
     inlines = [UserLoginHistoryInline]
     list_display = ['username', 'email', 'first_name', 'last_name', 'is_staff', 'last_login_display', 'login_count']
+    show_full_result_count = False
+    
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
     
     def last_login_display(self, obj):
-        last_login = UserLoginHistory.objects.filter(user=obj).order_by('-login_time').first()
-        return last_login.login_time if last_login else 'Never'
+        return obj.last_login_time or 'Never'
     last_login_display.short_description = 'Last Login'
     
     def login_count(self, obj):
-        return UserLoginHistory.objects.filter(user=obj).count()
+        return obj.login_total
     login_count.short_description = 'Login Count'
 
 # Re-register UserAdmin
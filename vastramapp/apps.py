@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VastramappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vastramapp'
+
+    def ready(self):
+        from . import db, signals  # noqa: F401
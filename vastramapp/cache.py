@@ -0,0 +1,113 @@
+# cache.py - Versioned catalog cache
+import time
+
+from django.core.cache import cache
+
+from .models import Cart, Category
+
+# Single version number shared by every catalog-derived cache entry. Bumping it
+# (see signals.py) makes all old keys unreachable, so we never have to hunt
+# down and delete individual entries after an admin edit.
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Upper bound on staleness for time-dependent sections (e.g. "last 30 days").
+HOME_CACHE_TIMEOUT = 60 * 15
+
+# Entries below are invalidated explicitly, the timeout only bounds how long
+# abandoned keys linger
+CATEGORIES_CACHE_TIMEOUT = 60 * 60 * 24
+CART_CACHE_TIMEOUT = 60 * 60 * 24
+# Rendered order summaries: keyed on updated_at, so this only bounds how long
+# they keep showing a product's old name or image
+ORDER_SUMMARY_TIMEOUT = 60 * 60 * 24
+
+# Orders in these states no longer change, short of an admin edit (which
+# moves updated_at and with it the summary key)
+FINAL_ORDER_STATUSES = ('delivered', 'cancelled')
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost/evicted version key can never roll back
+        # to a number whose entries are still sitting in the cache.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    # A fresh clock reading rather than incr(): FileBasedCache's incr is a
+    # read-modify-write, so two bumps could both write the same number.
+    # Concurrent plain sets each leave a value no reader has seen before.
+    version = time.time_ns()
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def catalog_key(name, version=None):
+    if version is None:
+        version = get_catalog_version()
+    return f'catalog:{version}:{name}'
+
+
+def get_or_build(name, builder, timeout=HOME_CACHE_TIMEOUT, version=None):
+    """Return cached value for `name` under the current catalog version,
+    calling `builder()` and storing its result on a miss."""
+    key = catalog_key(name, version)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+# Process-local copy of the category list, keyed by catalog version
+_categories_memo = {'version': None, 'categories': None}
+
+
+def get_categories(request=None):
+    """All categories, for the nav bar and category pickers.
+
+    Looked up per request, then in this process, then in the shared cache,
+    and only then in the database. The catalog version (bumped by the
+    Category signals) keeps every layer fresh.
+    """
+    if request is not None and hasattr(request, '_categories'):
+        return request._categories
+
+    version = get_catalog_version()
+    if _categories_memo['version'] == version:
+        categories = _categories_memo['categories']
+    else:
+        categories = get_or_build('categories', lambda: list(Category.objects.all()),
+                                  timeout=CATEGORIES_CACHE_TIMEOUT, version=version)
+        _categories_memo.update(version=version, categories=categories)
+
+    if request is not None:
+        request._categories = categories
+    return categories
+
+
+def _cart_key(user_id):
+    return f'cart:{user_id}'
+
+
+def get_cart_contents(user):
+    """{product_id: quantity} for a signed-in user's cart, oldest line first."""
+    key = _cart_key(user.pk)
+    contents = cache.get(key)
+    if contents is None:
+        contents = dict(
+            Cart.objects.filter(user=user).order_by('id').values_list('product_id', 'quantity')
+        )
+        cache.set(key, contents, CART_CACHE_TIMEOUT)
+    return contents
+
+
+def invalidate_cart(user_id):
+    cache.delete(_cart_key(user_id))
+
+
+def order_summary_key(order):
+    return f'order-summary:{order.order_id}:{order.updated_at.timestamp()}'
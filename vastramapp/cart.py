@@ -0,0 +1,129 @@
+# cart.py - Cart storage: the session for guests, Cart rows for users
+from django.db import transaction
+from django.db.models import F
+
+from .cache import get_cart_contents, invalidate_cart
+from .models import Cart, Product
+
+CART_SESSION_KEY = 'cart'
+
+
+class BaseCart:
+    """Common read side. Subclasses provide contents() as
+    {product_id: quantity} plus the mutations."""
+
+    def contents(self):
+        raise NotImplementedError
+
+    def count(self):
+        return len(self.contents())
+
+    def lines(self):
+        """Cart instances (unsaved for guests) with product and category
+        loaded, in the order items were added."""
+        contents = self.contents()
+        if not contents:
+            return []
+        products = Product.objects.filter(pk__in=list(contents), is_active=True).select_related('category').in_bulk()
+        return [
+            Cart(product=products[pk], quantity=quantity)
+            for pk, quantity in contents.items() if pk in products
+        ]
+
+    def total(self, lines=None):
+        return sum(line.total_price() for line in (self.lines() if lines is None else lines))
+
+
+class SessionCart(BaseCart):
+    """Guest cart kept in the session - no writes to the main database."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def contents(self):
+        return {int(pk): qty for pk, qty in self.session.get(CART_SESSION_KEY, {}).items()}
+
+    def _save(self, contents):
+        # JSON session serializer: keys must be strings
+        self.session[CART_SESSION_KEY] = {str(pk): qty for pk, qty in contents.items()}
+
+    def add(self, product, quantity=1):
+        contents = self.contents()
+        contents[product.pk] = contents.get(product.pk, 0) + quantity
+        self._save(contents)
+
+    def set_quantity(self, product_id, quantity):
+        contents = self.contents()
+        if product_id in contents:
+            contents[product_id] = quantity
+            self._save(contents)
+
+    def remove(self, product_id):
+        contents = self.contents()
+        if contents.pop(product_id, None) is not None:
+            self._save(contents)
+
+    def clear(self):
+        self.session.pop(CART_SESSION_KEY, None)
+
+
+class DatabaseCart(BaseCart):
+    """Signed-in cart: Cart rows, read through the per-user cache."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def contents(self):
+        return get_cart_contents(self.user)
+
+    def add(self, product, quantity=1):
+        # One UPDATE in the common case, an upsert only for a new line. The
+        # transaction takes the write lock up front (IMMEDIATE, see
+        # settings), so a concurrent add can't land between the two.
+        rows = Cart.objects.filter(user=self.user, product=product)
+        with transaction.atomic():
+            if not rows.update(quantity=F('quantity') + quantity):
+                Cart.objects.bulk_create(
+                    [Cart(user=self.user, product=product, quantity=quantity)],
+                    update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity'],
+                )
+        invalidate_cart(self.user.pk)  # update() skips the signals
+
+    def set_quantity(self, product_id, quantity):
+        Cart.objects.filter(user=self.user, product_id=product_id).update(quantity=quantity)
+        invalidate_cart(self.user.pk)
+
+    def remove(self, product_id):
+        Cart.objects.filter(user=self.user, product_id=product_id).delete()
+
+
+def get_cart(request):
+    if request.user.is_authenticated:
+        return DatabaseCart(request.user)
+    return SessionCart(request.session)
+
+
+def merge_session_cart(session, user):
+    """Fold a guest cart into the user's Cart rows at login, adding
+    quantities for products already in both."""
+    guest = SessionCart(session)
+    contents = guest.contents()
+    if not contents:
+        return
+    valid = set(Product.objects.filter(pk__in=list(contents)).values_list('pk', flat=True))
+    with transaction.atomic():
+        existing = {
+            line.product_id: line
+            for line in Cart.objects.filter(user=user, product_id__in=valid).only('id', 'product_id')
+        }
+        for line in existing.values():
+            # Added in the UPDATE itself, so a concurrent add isn't overwritten
+            line.quantity = F('quantity') + contents[line.product_id]
+        # One UPDATE and one upsert however many lines there are
+        Cart.objects.bulk_update(list(existing.values()), ['quantity'])
+        Cart.objects.bulk_create([
+            Cart(user=user, product_id=pk, quantity=qty)
+            for pk, qty in contents.items() if pk in valid and pk not in existing
+        ], update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity'])
+    guest.clear()
+    invalidate_cart(user.pk)
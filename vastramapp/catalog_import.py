@@ -0,0 +1,299 @@
+# catalog_import.py - Streaming bulk import of categories and products
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import search
+from .cache import bump_catalog_version
+from .db import retry_on_locked
+from .models import Category, Product
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+
+# Read size when comparing an image with the stored copy
+COMPARE_CHUNK = 64 * 1024
+
+# Written on conflict; created_at, sales_count and the image variants are kept
+UPDATE_FIELDS = [
+    'category', 'name', 'description', 'actual_price', 'special_price',
+    'stock', 'is_active', 'is_featured', 'updated_at',
+]
+
+# Product prices are DecimalField(max_digits=10, decimal_places=2)
+PRICE_STEP = Decimal('0.01')
+MAX_PRICE = Decimal(10) ** 8
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return 'jsonl' if ext in ('jsonl', 'ndjson') else 'csv'
+
+
+def read_rows(path, fmt):
+    """Yield (row_number, row dict or RowError) one row at a time. CSV rows
+    are counted from the first one after the header, JSONL rows by line."""
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for number, row in enumerate(csv.DictReader(f), 1):
+                yield number, row
+    else:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    yield number, RowError(f'invalid JSON: {exc}')
+                    continue
+                yield number, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+def _text(row, name, required=False):
+    value = row.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{name} is required')
+    return value
+
+
+def _decimal(row, name):
+    try:
+        value = Decimal(_text(row, name, required=True))
+    except InvalidOperation:
+        raise RowError(f'{name} is not a number')
+    if not value.is_finite() or not 0 <= value < MAX_PRICE:
+        raise RowError(f'{name} is out of range')
+    return value.quantize(PRICE_STEP)
+
+
+def _int(row, name, default=0):
+    value = _text(row, name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f'{name} is not a whole number')
+    if number < 0:
+        raise RowError(f'{name} is negative')
+    return number
+
+
+def _bool(row, name, default):
+    value = row.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f'{name} must be true or false')
+
+
+def same_content(path, name):
+    """Whether local file `path` matches stored file `name` byte for byte."""
+    if default_storage.size(name) != os.path.getsize(path):
+        return False
+    with open(path, 'rb') as local, default_storage.open(name, 'rb') as stored:
+        for chunk in iter(lambda: local.read(COMPARE_CHUNK), b''):
+            if stored.read(len(chunk)) != chunk:
+                return False
+    return True
+
+
+class Checkpoint:
+    """Rows committed so far for one source file, kept in a small JSON file
+    next to it. Stale if the source changed size since it was written."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.size = os.path.getsize(source)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('source') != self.source or state.get('size') != self.size:
+            return None
+        return state
+
+    def save(self, rows, stats):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'source': self.source, 'size': self.size, 'rows': rows, 'stats': stats}, f)
+        os.replace(tmp, self.path)  # never leave a half-written checkpoint
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CatalogImporter:
+    """Upserts products by SKU from a CSV/JSONL file in batches.
+
+    Columns: sku, name, category, description, actual_price, special_price,
+    stock, is_active, is_featured, image. Categories are matched by name and
+    created when missing; `image` is a file name under `image_dir`, copied
+    into media/products/. Only one batch is held in memory, and each batch
+    commits with its checkpoint, so an interrupted run picks up after the
+    last committed batch.
+
+    Each batch updates the search index for its own rows. With `full` (the
+    file is the whole catalog) that is skipped and the index is rebuilt once
+    at the end instead.
+    """
+
+    def __init__(self, path, fmt=None, image_dir=None, batch_size=DEFAULT_BATCH_SIZE,
+                 checkpoint_path=None, on_error=None, on_progress=None, full=False):
+        self.path = path
+        self.fmt = fmt or detect_format(path)
+        self.image_dir = image_dir
+        self.batch_size = batch_size
+        self.checkpoint = Checkpoint(checkpoint_path or f'{path}.checkpoint.json', path)
+        self.on_error = on_error or (lambda number, message: None)
+        self.on_progress = on_progress or (lambda stats: None)
+        self.full = full
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'errors': 0}
+
+    def run(self, resume=True):
+        state = self.checkpoint.load() if resume else None
+        skip = 0
+        if state:
+            skip = state['rows']
+            self.stats.update(state['stats'])
+
+        started = time.monotonic()
+        batch = {}
+        rows_done = skip
+        for number, row in read_rows(self.path, self.fmt):
+            if number <= skip:
+                continue
+            rows_done = number
+            self.stats['rows'] += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                product = self.build_product(row)
+            except RowError as exc:
+                self.stats['errors'] += 1
+                self.on_error(number, str(exc))
+                continue
+            batch[product.sku] = (number, product)  # a repeated SKU: last row wins
+            if len(batch) >= self.batch_size:
+                self.flush(batch, rows_done, started)
+                batch = {}
+        self.flush(batch, rows_done, started)
+
+        if self.full and search.is_available():
+            search.rebuild_index()
+        bump_catalog_version()  # bulk writes skip the model signals
+        self.checkpoint.clear()
+        return self.stats
+
+    def build_product(self, row):
+        sku = _text(row, 'sku', required=True)
+        if len(sku) > 64:
+            raise RowError('sku is longer than 64 characters')
+        actual_price = _decimal(row, 'actual_price')
+        special_price = _decimal(row, 'special_price') if _text(row, 'special_price') else actual_price
+        product = Product(
+            sku=sku,
+            name=_text(row, 'name', required=True)[:200],
+            description=_text(row, 'description'),
+            actual_price=actual_price,
+            special_price=special_price,
+            stock=_int(row, 'stock'),
+            is_active=_bool(row, 'is_active', True),
+            is_featured=_bool(row, 'is_featured', False),
+        )
+        category = _text(row, 'category', required=True)
+        # Side effects last, once the row is known to be valid
+        product.image = self.link_image(_text(row, 'image'))
+        product.category_id = self.category_id(category)
+        return product
+
+    def category_id(self, name):
+        if name not in self.categories:
+            # Outside the batch transaction, so a retried batch still finds it
+            self.categories[name] = Category.objects.create(name=name[:100]).pk
+        return self.categories[name]
+
+    def link_image(self, filename):
+        """Storage name for `filename` under media/products/, copying the file
+        over unless an identical copy is already there. '' if none given."""
+        if not filename:
+            return ''
+        if self.image_dir is None:
+            raise RowError('image given but no image directory')
+        source = os.path.join(self.image_dir, filename)
+        if not os.path.isfile(source):
+            raise RowError(f'image not found: {filename}')
+        name = f'products/{os.path.basename(filename)}'
+        if default_storage.exists(name):
+            if same_content(source, name):
+                return name
+            # Replace it under the same name; save() would otherwise add a new
+            # _xxxxxxx copy on every run. Its derivatives are stale now too
+            default_storage.delete(name)
+            Product.objects.filter(image=name).update(image_variants={})
+        with open(source, 'rb') as f:
+            return default_storage.save(name, File(f))
+
+    def flush(self, batch, rows_done, started):
+        if not batch:
+            return
+        existing, rejected = self.write_batch(batch)
+        for number in rejected:
+            self.stats['errors'] += 1
+            self.on_error(number, 'image is required for a new product')
+        self.stats['updated'] += existing
+        self.stats['created'] += len(batch) - existing - len(rejected)
+        self.checkpoint.save(rows_done, self.stats)
+        self.stats['rate'] = round(self.stats['rows'] / max(time.monotonic() - started, 1e-6))
+        self.on_progress(self.stats)
+
+    @retry_on_locked
+    def write_batch(self, batch):
+        """Upsert one batch. Returns (number of existing SKUs, row numbers
+        rejected for lacking an image)."""
+        with transaction.atomic():
+            existing = set(Product.objects.filter(sku__in=list(batch)).values_list('sku', flat=True))
+            with_image, without_image, rejected = [], [], []
+            for sku, (number, product) in batch.items():
+                if product.image:
+                    with_image.append(product)
+                elif sku in existing:
+                    without_image.append(product)  # keeps the image it already has
+                else:
+                    rejected.append(number)
+            # One INSERT .. ON CONFLICT(sku) DO UPDATE per group
+            for products, fields in ((with_image, UPDATE_FIELDS + ['image']), (without_image, UPDATE_FIELDS)):
+                if products:
+                    Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['sku'], update_fields=fields)
+            if not self.full:
+                # bulk_create skips the signals that keep the index in sync
+                for product in Product.objects.filter(sku__in=list(batch)).select_related('category'):
+                    search.index_product(product)
+        return len(existing), rejected
@@ -0,0 +1,97 @@
+# checkout.py - Order placement
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .db import retry_on_locked
+from .models import Cart, Order, OrderItem, Product, ShippingAddress
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCartError(CheckoutError):
+    pass
+
+
+class OutOfStockError(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(p.name for p in products) or 'some items'
+        super().__init__(f'Not enough stock for: {names}')
+
+
+class _Oversold(Exception):
+    """Internal signal to roll back the order transaction."""
+
+
+@retry_on_locked
+def place_order(user, shipping_data):
+    """Turn the user's cart into an Order in one transaction.
+
+    Stock is taken with a single conditional UPDATE (stock >= quantity for
+    every product), so two buyers racing for the last unit can never both
+    win. If any product is short the whole transaction is rolled back and
+    OutOfStockError lists the offenders.
+    """
+    try:
+        with transaction.atomic():
+            cart_items = list(Cart.objects.filter(user=user).select_related('product'))
+            if not cart_items:
+                raise EmptyCartError('Your cart is empty!')
+
+            quantities = defaultdict(int)
+            for item in cart_items:
+                quantities[item.product_id] += item.quantity
+
+            # Row locks on backends that support them; the conditional UPDATE
+            # below is what keeps SQLite correct
+            products = Product.objects.select_for_update().in_bulk(list(quantities))
+
+            quantity = Case(
+                *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            updated = Product.objects.filter(
+                pk__in=list(quantities),
+                is_active=True,
+                stock__gte=quantity,
+            ).update(
+                stock=F('stock') - quantity,
+                sales_count=F('sales_count') + quantity,
+                updated_at=timezone.now(),  # update() skips auto_now; conditional GETs rely on it
+            )
+            if updated != len(quantities):
+                raise _Oversold()
+
+            shipping_address = ShippingAddress.objects.create(user=user, **shipping_data)
+            order = Order.objects.create(
+                user=user,
+                shipping_address=shipping_address,
+                total_amount=sum(products[pk].special_price * qty for pk, qty in quantities.items()),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=pk, quantity=qty, price=products[pk].special_price)
+                for pk, qty in quantities.items()
+            ])
+
+            # Only the rows we read - anything added meanwhile stays in the cart
+            Cart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+
+            # update() skips signals; refresh cached pages when something sells out
+            if Product.objects.filter(pk__in=list(quantities), stock=0).exists():
+                transaction.on_commit(bump_catalog_version)
+    except _Oversold:
+        # Rolled back, so this read shows the real stock levels
+        short = [
+            p for p in Product.objects.filter(pk__in=list(quantities))
+            if not p.is_active or p.stock < quantities[p.pk]
+        ]
+        raise OutOfStockError(short)
+
+    return order
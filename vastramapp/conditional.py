@@ -0,0 +1,73 @@
+# conditional.py - ETag/Last-Modified handling for catalog pages
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .cart import get_cart
+
+
+def _visitor_state(request):
+    """What the shared base template shows about this visitor: who they
+    are and the cart badge. Empty for a guest with nothing in the cart."""
+    state = ()
+    if request.user.is_authenticated:
+        state += (request.user.pk,)
+    count = get_cart(request).count()
+    if count:
+        state += ('cart', count)
+    return state
+
+
+def _uncacheable(response):
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_page(validators):
+    """Answer GET/HEAD with 304 Not Modified when the page hasn't changed.
+
+    `validators(request, *args, **kwargs)` returns `(parts, last_modified)`:
+    cheap values that change whenever the rendered page would, and a
+    datetime (or None) for Last-Modified. Only the ETag is weak, since the
+    CSRF token makes renders differ byte for byte. The parts are left on
+    the request for the page cache (see page_cache.py).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return _uncacheable(view(request, *args, **kwargs))
+
+            parts, last_modified = validators(request, *args, **kwargs)
+            request.page_validators = parts
+            # Pending flash messages have to be rendered, never skipped
+            if len(get_messages(request)):
+                return _uncacheable(view(request, *args, **kwargs))
+
+            visitor = _visitor_state(request)
+            digest = hashlib.md5(repr((parts, visitor)).encode(), usedforsecurity=False).hexdigest()
+            etag = f'W/"{digest}"'
+            # A timestamp can't see per-visitor changes, so only shared pages get one
+            if visitor or last_modified is None:
+                timestamp = None
+            else:
+                timestamp = int(last_modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault('ETag', etag)
+                if timestamp is not None:
+                    response.headers.setdefault('Last-Modified', http_date(timestamp))
+                # Stored, but revalidated on every use. Proxies only keep guest
+                # pages without a form: a CSRF token belongs to one visitor
+                shared = not visitor and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                patch_cache_control(response, no_cache=True, **{'public' if shared else 'private': True})
+                patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
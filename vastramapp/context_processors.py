@@ -1,17 +1,15 @@
 # context_processors.py - Updated
 from .models import Category, Cart, Wishlist
+from .cache import get_categories
+from .cart import get_cart
 
 def categories(request):
     return {
-        'categories': Category.objects.all()
+        'categories': get_categories(request)
     }
     
 def cart_count(request):
-    if request.user.is_authenticated:
-        cart_count = Cart.objects.filter(user=request.user).count()
-    else:
-        cart_count = 0
-    return {'cart_count': cart_count}
+    return {'cart_count': get_cart(request).count()}
 
 def wishlist_count(request):
     if request.user.is_authenticated:
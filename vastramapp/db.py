@@ -0,0 +1,51 @@
+# db.py - SQLite connection tuning and lock handling
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # The values live in settings.SQLITE_PRAGMAS only; none if it's unset
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(m in str(exc) for m in LOCK_MESSAGES)
+
+
+def retry_on_locked(func):
+    """Re-run a write transaction that failed because SQLite was locked.
+
+    The busy timeout already waits for the lock; this covers the case where
+    a writer holds it longer than that. Only the outermost transaction is
+    retried - inside someone else's atomic block the error is re-raised.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = getattr(settings, 'SQLITE_LOCK_RETRIES', 3)
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == retries or not is_lock_error(exc) or connection.in_atomic_block:
+                    raise
+                delay = 0.05 * 2 ** attempt * (1 + random.random())
+                logger.warning('%s hit a locked database, retry %d in %.2fs', func.__qualname__, attempt + 1, delay)
+                time.sleep(delay)
+    return wrapper
@@ -0,0 +1,115 @@
+# facets.py - Price/discount/stock filters and sorting for product listings
+from django.db.models import Count, Q
+
+# key -> (label, low, high), on the price the customer pays; low inclusive
+PRICE_RANGES = {
+    'under-500': ('Under ₹500', None, 500),
+    '500-1000': ('₹500 - ₹1000', 500, 1000),
+    '1000-2000': ('₹1000 - ₹2000', 1000, 2000),
+    'over-2000': ('Over ₹2000', 2000, None),
+}
+
+# "N% off or more", on the generated discount_percent column
+DISCOUNTS = (10, 25, 50)
+
+# Keyset orderings; each ends in id so cursors are unique. The category
+# indexes in models.Product cover every one of them.
+SORTS = {
+    'newest': ('Newest', ('-created_at', '-id')),
+    'popular': ('Most Popular', ('-sales_count', '-id')),
+    'price_low': ('Price: Low to High', ('special_price', 'id')),
+    'price_high': ('Price: High to Low', ('-special_price', '-id')),
+    'discount': ('Biggest Discount', ('-discount_percent', '-id')),
+}
+
+# Search results can also keep their BM25 order
+RELEVANCE = 'relevance'
+
+
+def price_q(key):
+    label, low, high = PRICE_RANGES[key]
+    q = Q()
+    if low is not None:
+        q &= Q(special_price__gte=low)
+    if high is not None:
+        q &= Q(special_price__lt=high)
+    return q
+
+
+def _count(q):
+    return Count('pk', filter=q) if q else Count('pk')
+
+
+class ProductFilters:
+    """Facet selections and sort read from the query string. Unknown or
+    malformed values are ignored rather than rejected."""
+
+    def __init__(self, params, default_sort='newest', relevance=False):
+        price = params.get('price')
+        self.price = price if price in PRICE_RANGES else None
+        try:
+            discount = int(params.get('discount', ''))
+        except ValueError:
+            discount = None
+        self.discount = discount if discount in DISCOUNTS else None
+        self.in_stock = params.get('in_stock') == '1'
+
+        self.sort_options = ([(RELEVANCE, 'Relevance')] if relevance else []) + [
+            (key, label) for key, (label, ordering) in SORTS.items()
+        ]
+        sort = params.get('sort')
+        self.sort = sort if sort in dict(self.sort_options) else default_sort
+
+    @property
+    def active(self):
+        return bool(self.price or self.discount or self.in_stock)
+
+    @property
+    def ordering(self):
+        return SORTS[self.sort][1]
+
+    def q(self, exclude=None):
+        """The selected facets ANDed together, leaving out `exclude`."""
+        conditions = {
+            'price': price_q(self.price) if self.price else Q(),
+            'discount': Q(discount_percent__gte=self.discount) if self.discount else Q(),
+            'in_stock': Q(stock__gt=0) if self.in_stock else Q(),
+        }
+        q = Q()
+        for name, condition in conditions.items():
+            if name != exclude:
+                q &= condition
+        return q
+
+    def apply(self, queryset):
+        return queryset.filter(self.q())
+
+    def counts(self, queryset):
+        """Counts for every facet option over `queryset`, in one query.
+
+        Each option is counted with the other facets' selections applied
+        but not its own, so after picking a price range the other ranges
+        still show what choosing them instead would give.
+        """
+        price_keys = list(PRICE_RANGES)
+        aggregates = {'total': _count(self.q()), 'in_stock': _count(Q(stock__gt=0) & self.q(exclude='in_stock'))}
+        for i, key in enumerate(price_keys):
+            aggregates[f'price_{i}'] = _count(price_q(key) & self.q(exclude='price'))
+        for i, discount in enumerate(DISCOUNTS):
+            aggregates[f'discount_{i}'] = _count(Q(discount_percent__gte=discount) & self.q(exclude='discount'))
+        counts = queryset.order_by().aggregate(**aggregates)
+
+        return {
+            'total': counts['total'],
+            'prices': [
+                {'key': key, 'label': PRICE_RANGES[key][0], 'count': counts[f'price_{i}'], 'selected': key == self.price}
+                for i, key in enumerate(price_keys)
+            ],
+            'discounts': [
+                {'key': discount, 'label': f'{discount}% off or more', 'count': counts[f'discount_{i}'],
+                 'selected': discount == self.discount}
+                for i, discount in enumerate(DISCOUNTS)
+            ],
+            'in_stock': {'count': counts['in_stock'], 'selected': self.in_stock},
+            'sorts': [{'key': key, 'label': label, 'selected': key == self.sort} for key, label in self.sort_options],
+        }
@@ -0,0 +1,145 @@
+# images.py - Responsive image derivatives
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .cache import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Model -> image field that gets derivatives. Each field `x` has a sibling
+# JSONField `x_variants` holding what was generated.
+IMAGE_FIELDS = {
+    'vastramapp.Product': 'image',
+    'vastramapp.Category': 'thumbnail',
+    'vastramapp.Slider': 'image',
+    'vastramapp.Event': 'image',
+}
+
+DERIVATIVE_WIDTHS = (200, 400, 800, 1200, 1920)
+DERIVATIVE_DIR = 'derivatives'
+QUALITY = {'webp': 80, 'avif': 60}
+
+# One worker is plenty: uploads are rare and AVIF encoding is CPU-heavy
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def enabled_formats():
+    """Output formats, most efficient first, limited to what Pillow can encode."""
+    wanted = getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', ('avif', 'webp'))
+    return [fmt for fmt in wanted if features.check(fmt)]
+
+
+def derivative_name(source_name, width, fmt):
+    stem, _ = os.path.splitext(source_name)
+    return f'{DERIVATIVE_DIR}/{stem}-{width}w.{fmt}'
+
+
+def target_widths(original_width):
+    widths = {w for w in DERIVATIVE_WIDTHS if w < original_width}
+    widths.add(min(original_width, DERIVATIVE_WIDTHS[-1]))
+    return sorted(widths)
+
+
+def build_variants(source_name):
+    """Resize `source_name` into every width/format and save the files.
+
+    Returns the dict stored in the model's *_variants field:
+    {'source': name, 'width': w, 'height': h,
+     'formats': {'webp': [[name, w, h], ...], ...}}
+    """
+    with default_storage.open(source_name, 'rb') as f:
+        image = Image.open(f)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    original_width, original_height = image.size
+    formats = enabled_formats()
+    variants = {
+        'source': source_name,
+        'width': original_width,
+        'height': original_height,
+        'formats': {fmt: [] for fmt in formats},
+    }
+    for width in target_widths(original_width):
+        height = max(1, round(original_height * width / original_width))
+        resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            buffer = BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=QUALITY.get(fmt, 75))
+            name = derivative_name(source_name, width, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            variants['formats'][fmt].append([name, width, height])
+    return variants
+
+
+def process_derivatives(model_label, pk, field_name, source_name, invalidate=True):
+    """Generate derivatives for one stored image and record them on the row.
+
+    Returns True when the row was updated. Safe to run from any thread.
+    Rows with an updated_at (products, events) get it moved, which changes
+    only their own pages' validators. Other models show up on
+    catalog-versioned pages, so the version is bumped - unless `invalidate`
+    is False, for a backfill that bumps once when it's done.
+    """
+    if not default_storage.exists(source_name):
+        logger.warning('Image %s for %s #%s is missing, skipping derivatives', source_name, model_label, pk)
+        return False
+    try:
+        variants = build_variants(source_name)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception('Could not build derivatives for %s', source_name)
+        return False
+
+    model = apps.get_model(model_label)
+    changes = {variants_field(field_name): variants}
+    has_updated_at = any(f.name == 'updated_at' for f in model._meta.concrete_fields)
+    if has_updated_at:
+        changes['updated_at'] = timezone.now()
+    # Filter on the source name so a newer upload is never overwritten with
+    # variants of the old one; update() also avoids re-firing post_save
+    updated = model.objects.filter(pk=pk, **{field_name: source_name}).update(**changes)
+    if updated and invalidate and not has_updated_at:
+        bump_catalog_version()
+    return bool(updated)
+
+
+def _run_in_worker(*args):
+    try:
+        process_derivatives(*args)
+    except Exception:
+        logger.exception('Image derivative job failed: %r', args)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(instance, field_name):
+    """Queue derivative generation after commit if the image changed."""
+    fieldfile = getattr(instance, field_name)
+    variants = getattr(instance, variants_field(field_name)) or {}
+    if not fieldfile:
+        if variants:
+            type(instance).objects.filter(pk=instance.pk).update(**{variants_field(field_name): {}})
+        return
+    if variants.get('source') == fieldfile.name:
+        return
+    args = (instance._meta.label, instance.pk, field_name, fieldfile.name)
+    transaction.on_commit(lambda: _executor.submit(_run_in_worker, *args))
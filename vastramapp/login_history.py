@@ -0,0 +1,178 @@
+# login_history.py - Write-behind queue for UserLoginHistory
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import UserLoginHistory
+
+logger = logging.getLogger(__name__)
+
+
+class LoginHistoryWriter:
+    """Buffers login events in memory and bulk-inserts them from a
+    background thread, so the login request never waits on SQLite's write
+    lock.
+
+    Batches that cannot be written (database locked, process shutting
+    down) go to JSONL spool files and are replayed the next time a writer
+    starts, so events survive worker restarts.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=2.0, spool_dir=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def record(self, **event):
+        event.setdefault('login_time', timezone.now())
+        self._ensure_started()
+        self._queue.put(event)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='login-history-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def _run(self):
+        self._replay_spool()
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+            else:
+                # Idle - retry anything spooled while the database was busy
+                self._replay_spool()
+            connections.close_all()
+
+    def _collect_batch(self):
+        """Block for the first event, then gather more until the batch is
+        full or flush_interval has passed."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _write(self, events):
+        try:
+            # Skip users deleted while their event sat in the queue - SQLite
+            # only checks the foreign key at commit, failing the whole batch
+            existing = set(User.objects.filter(pk__in={e['user_id'] for e in events}).values_list('pk', flat=True))
+            self._bulk_insert([e for e in events if e['user_id'] in existing])
+        except DatabaseError:
+            logger.exception('Login history batch failed, spooling %d events', len(events))
+            self._spool(events)
+
+    def _bulk_insert(self, events):
+        UserLoginHistory.objects.bulk_create(
+            [UserLoginHistory(**event) for event in events],
+            batch_size=self.batch_size,
+        )
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        events = self._drain()
+        if events:
+            self._write(events)
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 1)
+        # Whatever can't be written now is spooled for the next start
+        self.flush()
+
+    def _spool(self, events):
+        if self.spool_dir is None:
+            logger.error('Dropping %d login history events: no spool directory configured', len(events))
+            return
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spool_dir / f'login-{os.getpid()}-{uuid.uuid4().hex}.jsonl'
+        with open(path, 'w') as f:
+            for event in events:
+                f.write(json.dumps({**event, 'login_time': event['login_time'].isoformat()}) + '\n')
+
+    def _replay_spool(self):
+        if self.spool_dir is None or not self.spool_dir.exists():
+            return
+        for path in sorted(self.spool_dir.glob('login-*.jsonl')):
+            # Rename first so two workers starting together can't both replay it
+            claimed = path.with_name(f'claimed-{os.getpid()}-{path.name}')
+            try:
+                path.rename(claimed)
+            except OSError:
+                continue
+            with open(claimed) as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            for event in events:
+                event['login_time'] = datetime.fromisoformat(event['login_time'])
+            claimed.unlink()
+            if events:
+                self._write(events)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = LoginHistoryWriter(
+                    batch_size=getattr(settings, 'LOGIN_HISTORY_BATCH_SIZE', 100),
+                    flush_interval=getattr(settings, 'LOGIN_HISTORY_FLUSH_INTERVAL', 2.0),
+                    spool_dir=getattr(settings, 'LOGIN_HISTORY_SPOOL_DIR', None),
+                )
+    return _writer
+
+
+def record_login(user, ip_address, user_agent, device_id):
+    event = {
+        'user_id': user.pk,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'device_id': device_id,
+    }
+    if getattr(settings, 'LOGIN_HISTORY_ASYNC', True):
+        get_writer().record(**event)
+    else:
+        UserLoginHistory.objects.create(**event)
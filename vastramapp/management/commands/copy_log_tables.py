@@ -0,0 +1,38 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from vastramapp.routers import LOG_DATABASE, LOG_MODELS, log_database_enabled
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'One-off copy of login history, contact queries and sessions from the main database into the logs database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='default', help='Database holding the old tables (default: default)')
+
+    def handle(self, *args, **options):
+        if not log_database_enabled():
+            raise CommandError(f'No {LOG_DATABASE!r} database configured.')
+        source = options['source']
+        for label in sorted(LOG_MODELS):
+            model = apps.get_model(label)
+            name = model._meta.verbose_name_plural
+            if model.objects.using(LOG_DATABASE).exists():
+                self.stdout.write(f'{name}: already has rows in {LOG_DATABASE}, skipped')
+                continue
+            copied = 0
+            batch = []
+            with transaction.atomic(using=LOG_DATABASE):
+                for obj in model.objects.using(source).order_by('pk').iterator(chunk_size=BATCH_SIZE):
+                    batch.append(obj)
+                    if len(batch) == BATCH_SIZE:
+                        model.objects.using(LOG_DATABASE).bulk_create(batch)
+                        copied += len(batch)
+                        batch = []
+                model.objects.using(LOG_DATABASE).bulk_create(batch)
+                copied += len(batch)
+            self.stdout.write(f'{name}: copied {copied}')
+        self.stdout.write(self.style.SUCCESS('Done. The old tables in the source database are no longer used.'))
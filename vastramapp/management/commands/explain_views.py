@@ -0,0 +1,139 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+
+from vastramapp import urls as app_urls
+from vastramapp.models import Category, Order, Product, Wishlist
+
+# Lookup tables with a handful of rows - scanning them is cheaper than an index
+SMALL_TABLES = {
+    'vastramapp_category', 'vastramapp_slider', 'vastramapp_specialoffer',
+    'vastramapp_aboutus', 'vastramapp_event', 'auth_group',
+}
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+TEMP_SORT = 'USE TEMP B-TREE'
+FROM_TABLE = re.compile(r'\bFROM "(\w+)"')
+
+
+class QueryCapture:
+    """execute_wrapper hook keeping the raw SQL and params of each SELECT."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Request every vastramapp page, EXPLAIN QUERY PLAN its queries and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to browse as (default: the user with the most orders)')
+        parser.add_argument('--ignore', action='append', default=[], metavar='TABLE',
+                            help='Also accept full scans of this table (repeatable)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the plan of every query')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if anything is flagged')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN parsing is SQLite specific.')
+        self.ignored = SMALL_TABLES | set(options['ignore'])
+        self.verbose_plans = options['verbose_plans']
+        user = self.pick_user(options['user'])
+        self.stdout.write(f'Browsing as {user.username}\n')
+
+        flagged = 0
+        # No caching, so every query a cold request would run shows up
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            client = Client(raise_request_exception=False)
+            for pattern in app_urls.urlpatterns:
+                if not isinstance(pattern, URLPattern) or not pattern.name:
+                    continue
+                kwargs = self.url_kwargs(pattern, user)
+                if kwargs is None:
+                    self.stdout.write(self.style.WARNING(f'{pattern.name}: no sample data, skipped'))
+                    continue
+                flagged += self.explain_view(client, user, pattern.name, reverse(pattern.name, kwargs=kwargs))
+
+        if flagged:
+            message = f'{flagged} queries with full scans or temp sorts.'
+            if options['fail_on_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('No full table scans.'))
+
+    def pick_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No user named {username!r}.')
+        user = User.objects.filter(order__isnull=False).order_by('-order__created_at').first() or User.objects.first()
+        if user is None:
+            raise CommandError('Create a user first.')
+        return user
+
+    def url_kwargs(self, pattern, user):
+        """Sample values for the route's parameters, or None if there are none."""
+        samples = {
+            'product_id': lambda: Product.objects.filter(is_active=True).values_list('pk', flat=True).first(),
+            'category_id': lambda: Category.objects.values_list('pk', flat=True).first(),
+            'wishlist_id': lambda: Wishlist.objects.filter(user=user).values_list('pk', flat=True).first(),
+            'order_id': lambda: Order.objects.filter(user=user).values_list('pk', flat=True).first(),
+        }
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            value = samples[name]() if name in samples else None
+            if value is None:
+                return None
+            kwargs[name] = value
+        return kwargs
+
+    def explain_view(self, client, user, name, url):
+        capture = QueryCapture()
+        with transaction.atomic():
+            # Logged in afresh each time since logout would end the session
+            client.force_login(user)
+            with connection.execute_wrapper(capture):
+                response = client.get(url)
+            # Plans must be taken before rolling back whatever the GET changed
+            plans = [(sql, self.explain(sql, params)) for sql, params in capture.queries]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{name} {url} -> {response.status_code}, {len(plans)} queries')
+        flagged = 0
+        for sql, plan in plans:
+            problems = self.problems(sql, plan)
+            if problems or self.verbose_plans:
+                style = self.style.WARNING if problems else (lambda s: s)
+                self.stdout.write(style(f'    {"; ".join(problems) or "ok"}'))
+                self.stdout.write(f'      {sql}')
+                for detail in plan:
+                    self.stdout.write(f'        {detail}')
+            flagged += bool(problems)
+        return flagged
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def problems(self, sql, plan):
+        found = []
+        table = FROM_TABLE.search(sql)
+        for detail in plan:
+            match = FULL_SCAN.match(detail.strip())
+            if match and match.group(1) not in self.ignored:
+                found.append(f'full scan of {match.group(1)}')
+            elif TEMP_SORT in detail and table and table.group(1) not in self.ignored:
+                found.append(detail.strip().lower())
+        return found
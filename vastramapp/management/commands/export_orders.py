@@ -0,0 +1,44 @@
+import sys
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from vastramapp import order_export
+from vastramapp.models import Order
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Dates look like 2025-01-31, got {value!r}.')
+
+
+class Command(BaseCommand):
+    help = 'Stream orders with their items, shipping address and feedback as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=order_export.FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--since', type=parse_date, help='First order date to include (YYYY-MM-DD)')
+        parser.add_argument('--until', type=parse_date, help='Last order date to include (YYYY-MM-DD)')
+        parser.add_argument('--status', choices=[value for value, label in Order.STATUS_CHOICES])
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        tz = timezone.get_current_timezone()
+        if options['since']:
+            orders = orders.filter(created_at__gte=datetime.combine(options['since'], time.min, tz))
+        if options['until']:
+            orders = orders.filter(created_at__lte=datetime.combine(options['until'], time.max, tz))
+        if options['status']:
+            orders = orders.filter(status=options['status'])
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in order_export.iter_export(orders, options['format']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from vastramapp import images
+from vastramapp.cache import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/AVIF derivatives for product, category, slider and event images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate even if derivatives are up to date')
+        parser.add_argument('--model', choices=[label.split('.')[1].lower() for label in images.IMAGE_FIELDS],
+                            help='Only process one model')
+
+    def handle(self, *args, **options):
+        formats = ', '.join(images.enabled_formats()) or 'none'
+        self.stdout.write(f'Output formats: {formats}')
+        total = 0
+        for label, field_name in images.IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            if options['model'] and model._meta.model_name != options['model']:
+                continue
+            done = skipped = 0
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for pk, name, variants in rows.values_list('pk', field_name, images.variants_field(field_name)).iterator():
+                if not options['force'] and (variants or {}).get('source') == name:
+                    skipped += 1
+                    continue
+                if images.process_derivatives(label, pk, field_name, name, invalidate=False):
+                    done += 1
+            total += done
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {done} generated, {skipped} up to date')
+        if total:
+            # Once for the whole run rather than once per image
+            bump_catalog_version()
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vastramapp.catalog_import import DEFAULT_BATCH_SIZE, FORMATS, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV/JSONL catalog file into Category and Product, upserting products by SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file (.csv or .jsonl)')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--images', metavar='DIR', help='Directory the image column is relative to')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f'Rows per transaction (default {DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--checkpoint', metavar='FILE', help='Default: <path>.checkpoint.json')
+        parser.add_argument('--restart', action='store_true', help='Ignore any checkpoint and start from the first row')
+        parser.add_argument('--full', action='store_true',
+                            help='The file is the whole catalog: rebuild the search index once at the end '
+                                 'instead of updating it batch by batch')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        try:
+            importer = CatalogImporter(
+                options['path'],
+                fmt=options['format'],
+                image_dir=options['images'],
+                batch_size=options['batch_size'],
+                checkpoint_path=options['checkpoint'],
+                on_error=lambda number, message: self.stderr.write(f'row {number}: {message}'),
+                on_progress=self.progress,
+                full=options['full'],
+            )
+        except OSError as exc:
+            raise CommandError(exc)
+        if not options['restart'] and importer.checkpoint.load():
+            self.stdout.write(f'Resuming after row {importer.checkpoint.load()["rows"]}')
+        stats = importer.run(resume=not options['restart'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats["created"]} created, {stats["updated"]} updated, {stats["errors"]} errors. '
+            'Run generate_image_derivatives for the new images.'
+        ))
+
+    def progress(self, stats):
+        self.stdout.write(f'{stats["rows"]} rows, {stats["errors"]} errors, {stats["rate"]} rows/s')
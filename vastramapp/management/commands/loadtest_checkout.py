@@ -0,0 +1,282 @@
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+
+from vastramapp.db import is_lock_error
+from vastramapp.models import Category, OrderItem, Product
+
+USER_PREFIX = 'loadtest_'
+CATEGORY_NAME = 'Load Test'
+PASSWORD = 'loadtest-pass-123'
+
+SHIPPING = {
+    'full_name': 'Load Tester',
+    'phone': '9999999999',
+    'address': '1 Bench Street',
+    'city': 'Pune',
+    'state': 'MH',
+    'pincode': '411001',
+}
+
+_outcomes_lock = threading.Lock()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class WsgiDriver:
+    """Drives the Django WSGI app in-process through the test client.
+
+    Exceptions from views are raised rather than rendered as a 500, so a
+    lock error is told apart from other failures by the exception itself.
+    """
+
+    def __init__(self, user):
+        self.client = Client(raise_request_exception=True)
+        self.client.force_login(user)
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get('Location', ''), response.content
+
+    def post(self, path, data):
+        response = self.client.post(path, data)
+        return response.status_code, response.get('Location', ''), response.content
+
+    def close(self):
+        connection.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    """Drives a running server over HTTP, logging in through the real form."""
+
+    def __init__(self, base_url, username):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+        self.get(reverse('login'))
+        status, location, _ = self.post(reverse('login'), {'username': username, 'password': PASSWORD})
+        if status != 302:
+            raise CommandError(f'Login failed for {username} (HTTP {status})')
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.headers.get('Location', ''), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location', ''), e.read()
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, data):
+        data = dict(data, csrfmiddlewaretoken=self._csrf_token())
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=urllib.parse.urlencode(data).encode(),
+            headers={'Referer': self.base_url + path, 'X-CSRFToken': self._csrf_token()},
+        )
+        return self._open(request)
+
+    def close(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed N users with carts for the same hot products and run cart/add, '
+        'checkout and orders concurrently. Writes to the configured database - '
+        'point it at a copy, not production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of concurrent buyers')
+        parser.add_argument('--workers', type=int, default=16, help='Thread pool size')
+        parser.add_argument('--products', type=int, default=3, help='Number of hot products')
+        parser.add_argument('--stock', type=int, default=40, help='Starting stock per hot product')
+        parser.add_argument('--quantity', type=int, default=2, help='Max units each user adds per product')
+        parser.add_argument('--url', help='Base URL of a running server; default drives the WSGI app in-process')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible carts')
+        parser.add_argument('--cleanup', action='store_true', help='Delete load-test users and products afterwards')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['products'] < 1:
+            raise CommandError('--users and --products must be at least 1.')
+        rng = random.Random(options['seed'])
+
+        users, products = self.seed(options)
+        plans = {
+            user.pk: [
+                (product.pk, rng.randint(1, options['quantity']))
+                for product in rng.sample(products, rng.randint(1, len(products)))
+            ]
+            for user in users
+        }
+        initial = {p.pk: (p.stock, p.sales_count) for p in products}
+
+        self.stdout.write(
+            f'Running {len(users)} buyers on {options["workers"]} workers against '
+            f'{options["url"] or "in-process WSGI app"}...'
+        )
+        latencies = defaultdict(list)
+        outcomes = defaultdict(int)
+
+        def buyer(user):
+            driver = None
+            try:
+                if options['url']:
+                    driver = HttpDriver(options['url'], user.username)
+                else:
+                    driver = WsgiDriver(user)
+                for product_id, quantity in plans[user.pk]:
+                    for _ in range(quantity):
+                        self.timed(driver.post, reverse('add_to_cart', args=[product_id]), 'cart/add', latencies, outcomes, {})
+                self.timed(driver.post, reverse('checkout'), 'checkout', latencies, outcomes, SHIPPING)
+                self.timed(driver.get, reverse('order_history'), 'orders', latencies, outcomes)
+            except Exception as e:
+                with _outcomes_lock:
+                    outcomes[f'error: {type(e).__name__}'] += 1
+            finally:
+                if driver is not None:
+                    driver.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(buyer, users))
+        elapsed = time.perf_counter() - started
+
+        self.report(elapsed, latencies, outcomes)
+        self.check_consistency(products, initial)
+
+        if options['cleanup']:
+            self.cleanup()
+
+    def seed(self, options):
+        self.cleanup()
+        category = Category.objects.create(name=CATEGORY_NAME, description='Synthetic load-test products')
+        products = [
+            Product.objects.create(
+                category=category,
+                name=f'Load Test Product {i + 1}',
+                description='Synthetic hot product',
+                actual_price=1000,
+                special_price=799,
+                image='products/loadtest.png',
+                stock=options['stock'],
+            )
+            for i in range(options['products'])
+        ]
+        # One hash for everyone - hashing per user would dominate seeding time
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(username=f'{USER_PREFIX}{i + 1}', password=password)
+            for i in range(options['users'])
+        ])
+        users = list(User.objects.filter(username__startswith=USER_PREFIX).order_by('id'))
+        return users, products
+
+    def timed(self, call, path, label, latencies, outcomes, data=None):
+        started = time.perf_counter()
+        try:
+            status, location, _ = call(path, data) if data is not None else call(path)
+        except Exception as e:
+            # Only the in-process driver raises these
+            outcome = f'{label}: database locked' if is_lock_error(e) else f'{label}: error: {type(e).__name__}'
+        else:
+            outcome = self.classify(label, status, location)
+        latencies[label].append((time.perf_counter() - started) * 1000)
+
+        with _outcomes_lock:
+            outcomes[outcome] += 1
+
+    def classify(self, label, status, location):
+        if status >= 500:
+            # Over HTTP a 500 page doesn't say why (with DEBUG off it's the
+            # same page for a lock error as for anything else)
+            return f'{label}: HTTP {status} (unknown)'
+        if label == 'checkout':
+            if location.endswith(reverse('order_history')):
+                return 'checkout: placed'
+            if location.endswith(reverse('cart')):
+                return 'checkout: rejected (stock/empty cart)'
+            return f'checkout: HTTP {status}'
+        return f'{label}: ok'
+
+    def report(self, elapsed, latencies, outcomes):
+        total = sum(len(v) for v in latencies.values())
+        self.stdout.write('')
+        self.stdout.write(f'Wall time: {elapsed:.2f}s, {total} requests, {total / elapsed:.1f} req/s')
+        placed = outcomes.get('checkout: placed', 0)
+        self.stdout.write(f'Orders placed: {placed} ({placed / elapsed:.1f} orders/s)')
+        self.stdout.write('')
+        self.stdout.write(f'{"endpoint":<12}{"count":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+        for label, values in latencies.items():
+            self.stdout.write(
+                f'{label:<12}{len(values):>8}{percentile(values, 50):>10.1f}'
+                f'{percentile(values, 95):>10.1f}{percentile(values, 99):>10.1f}{max(values):>10.1f}'
+            )
+        self.stdout.write('')
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f'{outcome:<45}{count:>8}')
+
+    def check_consistency(self, products, initial):
+        self.stdout.write('')
+        sold = dict(
+            OrderItem.objects.filter(product__in=products)
+            .values_list('product').annotate(total=Sum('quantity'))
+        )
+        consistent = True
+        for product in Product.objects.filter(pk__in=[p.pk for p in products]).order_by('pk'):
+            start_stock, start_sales = initial[product.pk]
+            units = sold.get(product.pk, 0)
+            ok = (
+                start_stock - product.stock == units
+                and product.sales_count - start_sales == units
+                and units <= start_stock
+            )
+            consistent &= ok
+            self.stdout.write(
+                f'{product.name}: stock {start_stock} -> {product.stock}, '
+                f'sales_count +{product.sales_count - start_sales}, ordered {units} '
+                f'[{"OK" if ok else "MISMATCH"}]'
+            )
+        if consistent:
+            self.stdout.write(self.style.SUCCESS('Inventory consistent: no oversell, no lost updates.'))
+        else:
+            self.stdout.write(self.style.ERROR('Inventory INCONSISTENT - see mismatches above.'))
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+        Category.objects.filter(name=CATEGORY_NAME).delete()
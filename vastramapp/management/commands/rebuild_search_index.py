@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vastramapp import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 product search index from scratch'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Full-text search index requires the SQLite backend.')
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} active products.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from vastramapp import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Fold new orders and wishlist additions into the co-purchase recommendations (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Drop the co-occurrence matrix and count everything again')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            orders, products = recommendations.rebuild_recommendations()
+        else:
+            orders, products = recommendations.update_recommendations()
+        state = recommendations.RollupState.objects.get(name=recommendations.STATE_NAME)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {orders} orders, re-ranked {products} products, '
+            f'high-water mark is now {timezone.localtime(state.high_water_mark):%Y-%m-%d %H:%M:%S}.'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from vastramapp import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll new orders up into the daily sales tables (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Drop the rollups and aggregate every order again')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rollups.rebuild_rollups()
+        else:
+            count = rollups.update_rollups()
+        state = rollups.RollupState.objects.get(name=rollups.ROLLUP_NAME)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {count} orders, high-water mark is now {timezone.localtime(state.high_water_mark):%Y-%m-%d %H:%M:%S}.'
+        ))
@@ -0,0 +1,128 @@
+# middleware.py - Request profiling
+import contextlib
+import contextvars
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+
+logger = logging.getLogger('vastramapp.slow_requests')
+
+# Profile of the request being handled on this thread/task
+_current_profile = contextvars.ContextVar('current_profile', default=None)
+
+
+def _patch_template_render():
+    """Time every top-level template render (includes are part of it).
+
+    Queries run lazily from the template are already counted as db time, so
+    they are subtracted to keep db/tpl/view from overlapping.
+    """
+    if getattr(DjangoTemplate.render, '_profiled', False):
+        return
+    original_render = DjangoTemplate.render
+
+    def render(self, *args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return original_render(self, *args, **kwargs)
+        started = time.perf_counter()
+        db_before = profile.recorder.duration
+        try:
+            return original_render(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            profile.template_time += elapsed - (profile.recorder.duration - db_before)
+
+    render._profiled = True
+    DjangoTemplate.render = render
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook that counts and times every query."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.queries.append((elapsed, sql))
+
+    def top(self, n):
+        return sorted(self.queries, key=lambda q: q[0], reverse=True)[:n]
+
+
+class RequestProfile:
+    def __init__(self):
+        self.recorder = QueryRecorder()
+        self.template_time = 0.0
+
+
+class RequestProfilingMiddleware:
+    """Adds a Server-Timing header (db, tpl, view, total) to every response
+    and logs a sample of slow requests with their most expensive queries.
+
+    Settings:
+        PROFILING_SLOW_REQUEST_MS  - log requests slower than this (default 500)
+        PROFILING_SAMPLE_RATE      - fraction of slow requests logged (default 1.0)
+        PROFILING_TOP_QUERIES      - queries included per log entry (default 5)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_REQUEST_MS', 500)
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 1.0)
+        self.top_queries = getattr(settings, 'PROFILING_TOP_QUERIES', 5)
+        _patch_template_render()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        recorder = profile.recorder
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        total = time.perf_counter() - started
+
+        db_ms = recorder.duration * 1000
+        tpl_ms = profile.template_time * 1000
+        total_ms = total * 1000
+        view_ms = max(total_ms - db_ms - tpl_ms, 0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries"',
+            f'tpl;dur={tpl_ms:.1f}',
+            f'view;dur={view_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        if total_ms >= self.slow_ms and random.random() < self.sample_rate:
+            self.log_slow_request(request, response, recorder, db_ms, tpl_ms, total_ms)
+        return response
+
+    def log_slow_request(self, request, response, recorder, db_ms, tpl_ms, total_ms):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '-'
+        lines = [
+            f'{request.method} {request.get_full_path()} view={view_name} '
+            f'status={response.status_code} total={total_ms:.1f}ms '
+            f'db={db_ms:.1f}ms ({recorder.count} queries) tpl={tpl_ms:.1f}ms'
+        ]
+        for elapsed, sql in recorder.top(self.top_queries):
+            lines.append(f'    {elapsed * 1000:8.1f}ms  {sql}')
+        logger.warning('\n'.join(lines))
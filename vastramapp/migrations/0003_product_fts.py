@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS vastramapp_product_fts USING fts5(
+            name, description, category,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    schema_editor.execute("""
+        INSERT INTO vastramapp_product_fts (rowid, name, description, category)
+        SELECT p.id, p.name, p.description, c.name
+        FROM vastramapp_product p
+        JOIN vastramapp_category c ON c.id = p.category_id
+        WHERE p.is_active
+    """)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS vastramapp_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vastramapp', '0002_alter_order_order_id_alter_order_total_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vastramapp', '0004_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userloginhistory',
+            name='login_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
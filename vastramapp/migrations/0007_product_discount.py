@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:20
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vastramapp', '0006_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_amount',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(models.Q(('actual_price__gt', models.F('special_price'))), then=django.db.models.expressions.CombinedExpression(models.F('actual_price'), '-', models.F('special_price'))), default=models.Value(0), output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(models.Q(('actual_price__gt', models.F('special_price'))), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('actual_price'), '*', models.Value(100))), models.IntegerField()), '-', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('special_price'), '*', models.Value(100))), models.IntegerField())), '*', models.Value(100)), '/', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('actual_price'), '*', models.Value(100))), models.IntegerField()))), default=models.Value(0), output_field=models.IntegerField()), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-discount_amount'], name='product_active_discount_idx'),
+        ),
+    ]
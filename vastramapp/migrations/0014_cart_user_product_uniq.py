@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 23:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # Keep the oldest line of each (user, product) with the summed quantity
+    Cart = apps.get_model('vastramapp', 'Cart')
+    duplicates = (
+        Cart.objects.values('user_id', 'product_id')
+        .annotate(n=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        Cart.objects.filter(pk=row['keep']).update(quantity=row['quantity'])
+        Cart.objects.filter(user_id=row['user_id'], product_id=row['product_id']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vastramapp', '0013_product_facet_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='cart_user_product_uniq'),
+        ),
+    ]
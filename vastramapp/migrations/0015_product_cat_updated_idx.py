@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vastramapp', '0014_cart_user_product_uniq'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'updated_at'], name='product_cat_updated_idx'),
+        ),
+    ]
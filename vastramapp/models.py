@@ -4,48 +4,100 @@ from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 import uuid
-from django.db.models import F
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Cast, Round
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     thumbnail = models.ImageField(upload_to='categories/', blank=True, null=True)
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return self.name
 
+def _cents(field):
+    return Cast(Round(F(field) * 100), models.IntegerField())
+
+ON_SALE = Q(actual_price__gt=F('special_price'))
+
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    # Supplier/feed key used by import_catalog; optional for hand-entered products
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField()
     actual_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     special_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     image = models.ImageField(upload_to='products/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     sales_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Generated columns - the database keeps them current, even through
+    # update()/bulk_create() paths that never call save()
+    discount_amount = models.GeneratedField(
+        expression=Case(
+            When(ON_SALE, then=F('actual_price') - F('special_price')),
+            default=Value(0),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    # Whole percent, rounded down; worked out in integer paise to avoid float error
+    discount_percent = models.GeneratedField(
+        expression=Case(
+            When(ON_SALE, then=(_cents('actual_price') - _cents('special_price')) * 100 / _cents('actual_price')),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    
+    class Meta:
+        indexes = [
+            # Most discounted rail: index range scan instead of sorting every product.
+            # Partial on is_active rather than a leading column - Django renders
+            # is_active=True as a bare `"is_active"` term, which SQLite can match
+            # against an index WHERE clause but not against an equality prefix
+            models.Index(fields=['-discount_amount'], condition=Q(is_active=True), name='product_active_discount_idx'),
+            # Home rails and category pages, all limited to active products the
+            # same way. Ascending on purpose: read backwards they give
+            # (x DESC, id DESC), the keyset ordering used by the views.
+            models.Index(fields=['sales_count'], condition=Q(is_active=True), name='product_active_sales_idx'),
+            models.Index(fields=['created_at'], condition=Q(is_active=True), name='product_active_created_idx'),
+            models.Index(fields=['category', 'created_at'], condition=Q(is_active=True), name='product_cat_created_idx'),
+            models.Index(fields=['category', 'sales_count'], condition=Q(is_active=True), name='product_cat_sales_idx'),
+            # Price and discount sorts on category pages
+            models.Index(fields=['category', 'special_price'], condition=Q(is_active=True), name='product_cat_price_idx'),
+            models.Index(fields=['category', 'discount_percent'], condition=Q(is_active=True), name='product_cat_discount_idx'),
+            # MAX(updated_at) per category for the conditional GET validators
+            # (views._category_validators) is one seek at the end of this.
+            # Not partial: deactivating a product changes the page too.
+            models.Index(fields=['category', 'updated_at'], name='product_cat_updated_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
-    def discount_percentage(self):
-        if self.actual_price and self.special_price and self.actual_price > self.special_price:
-            return int(((self.actual_price - self.special_price) / self.actual_price) * 100)
-        return 0
-    
     def decrease_stock(self, quantity=1):
         """Decrease stock by specified quantity"""
-        if self.stock >= quantity:
-            self.stock = F('stock') - quantity
-            self.sales_count = F('sales_count') + quantity
-            self.save()
-            return True
-        return False
+        # Conditional UPDATE so concurrent buyers can't push stock below zero
+        updated = Product.objects.filter(pk=self.pk, stock__gte=quantity).update(
+            stock=F('stock') - quantity,
+            sales_count=F('sales_count') + quantity,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            self.refresh_from_db(fields=['stock', 'sales_count'])
+        return bool(updated)
     
     def increase_stock(self, quantity=1):
         """Increase stock by specified quantity"""
@@ -57,6 +109,7 @@ class Slider(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(max_length=300)
     image = models.ImageField(upload_to='sliders/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, help_text="Category to redirect when clicked")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -87,6 +140,13 @@ class Cart(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        # One line per product per user; also the index behind every
+        # (user, product) lookup in cart.py
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='cart_user_product_uniq'),
+        ]
+    
     def total_price(self):
         if self.product and self.product.special_price and self.quantity:
             return self.product.special_price * self.quantity
@@ -131,6 +191,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Order history, newest first (read backwards, see Product)
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.order_id:
             self.order_id = f"TSH{uuid.uuid4().hex[:12].upper()}"
@@ -168,8 +234,10 @@ class OrderFeedback(models.Model):
         return f"Feedback for Order #{self.order.order_id}"
 
 class UserLoginHistory(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    login_time = models.DateTimeField(auto_now_add=True)
+    # Lives in the `logs` database (routers.py), so no cross-file constraint;
+    # rows are removed with their user by signals.delete_login_history
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    login_time = models.DateTimeField(default=timezone.now)  # set explicitly by the batched writer
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
     device_id = models.CharField(max_length=255, null=True, blank=True)
@@ -210,9 +278,77 @@ class Event(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     image = models.ImageField(upload_to='events/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     event_date = models.DateField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.title
+
+# Sales rollups - filled incrementally by `manage.py update_sales_rollups`
+# (see rollups.py) so reporting never scans Order/OrderItem
+
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily sales'
+    
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = [['date', 'product']]
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = [['date', 'category']]
+
+class RollupState(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)  # last Order.created_at rolled up
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.name
+
+
+# Co-purchase recommendations - built incrementally by
+# `manage.py update_recommendations` (see recommendations.py)
+
+class ProductCooccurrence(models.Model):
+    """One non-zero cell of the sparse item-item matrix: how often `other`
+    was bought or wishlisted together with `product`. Stored both ways."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    weight = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = [['product', 'other']]
+
+class ProductRecommendation(models.Model):
+    """Top neighbours of a product by co-occurrence weight, best first."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        # product_detail reads a product's list in rank order straight off this index
+        unique_together = [['product', 'rank']]
@@ -0,0 +1,96 @@
+# order_export.py - Streaming order export (CSV / JSONL)
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import OrderItem
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# Orders fetched per query; their items come in one prefetch query per chunk
+CHUNK_SIZE = 500
+
+ORDER_COLUMNS = ['order_id', 'created_at', 'status', 'total_amount', 'username', 'email']
+ADDRESS_COLUMNS = ['full_name', 'phone', 'address', 'city', 'state', 'pincode']
+ITEM_COLUMNS = ['product_id', 'product_name', 'sku', 'quantity', 'price']
+FEEDBACK_COLUMNS = ['rating', 'comment']
+
+CSV_HEADER = (
+    ORDER_COLUMNS
+    + [f'ship_{c}' for c in ADDRESS_COLUMNS]
+    + [f'item_{c}' for c in ITEM_COLUMNS]
+    + [f'feedback_{c}' for c in FEEDBACK_COLUMNS]
+)
+
+
+def export_queryset(queryset):
+    """Orders with everything the export needs, read in chunks.
+
+    User, address and feedback are joined in; items (with their product)
+    are prefetched per chunk, so memory stays flat however many orders
+    there are.
+    """
+    items = OrderItem.objects.select_related('product').only(
+        'order_id', 'quantity', 'price', 'product__name', 'product__sku',
+    ).order_by('pk')
+    return (
+        queryset.select_related('user', 'shipping_address', 'orderfeedback')
+        .prefetch_related(Prefetch('orderitem_set', queryset=items))
+        .order_by('pk')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def order_record(order):
+    address = order.shipping_address
+    # A missing reverse one-to-one raises an AttributeError subclass
+    feedback = getattr(order, 'orderfeedback', None)
+    return {
+        'order_id': order.order_id,
+        'created_at': order.created_at,
+        'status': order.status,
+        'total_amount': order.total_amount,
+        'username': order.user.username,
+        'email': order.user.email,
+        'shipping_address': {c: getattr(address, c) for c in ADDRESS_COLUMNS} if address else None,
+        'items': [
+            {'product_id': item.product_id, 'product_name': item.product.name, 'sku': item.product.sku,
+             'quantity': item.quantity, 'price': item.price}
+            for item in order.orderitem_set.all()
+        ],
+        'feedback': {c: getattr(feedback, c) for c in FEEDBACK_COLUMNS} if feedback else None,
+    }
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def iter_jsonl(orders):
+    for order in orders:
+        yield json.dumps(order_record(order), cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_csv(orders):
+    """One row per order item, order columns repeated; an order without
+    items still gets a row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in orders:
+        record = order_record(order)
+        head = [record[c] for c in ORDER_COLUMNS]
+        head += [(record['shipping_address'] or {}).get(c) for c in ADDRESS_COLUMNS]
+        tail = [(record['feedback'] or {}).get(c) for c in FEEDBACK_COLUMNS]
+        for item in record['items'] or [{}]:
+            yield writer.writerow(head + [item.get(c) for c in ITEM_COLUMNS] + tail)
+
+
+def iter_export(queryset, fmt):
+    orders = export_queryset(queryset)
+    return iter_csv(orders) if fmt == 'csv' else iter_jsonl(orders)
@@ -0,0 +1,75 @@
+# page_cache.py - Full-page cache for anonymous catalog browsing
+import hashlib
+import re
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from .cache import catalog_key
+
+# Entries are keyed on the page's validators, so they never go stale; the
+# timeout only bounds how long superseded pages linger
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Left in the cached HTML by {% hole %} (templatetags/page_holes.py)
+HOLE_MARKER = '<!--hole:{}-->'
+HOLE = re.compile(r'<!--hole:([\w/.-]+)-->')
+
+
+def punching_holes(request):
+    return getattr(request, '_punch_holes', False)
+
+
+def fill_holes(request, html):
+    """Render each hole's partial for this visitor. Each distinct partial
+    is rendered once, so messages are only consumed once."""
+    rendered = {}
+
+    def fill(match):
+        name = match.group(1)
+        if name not in rendered:
+            rendered[name] = render_to_string(name, request=request)
+        return rendered[name]
+
+    return HOLE.sub(fill, html)
+
+
+def cache_anonymous_page(view):
+    """Serve anonymous GETs from a cached render with the per-visitor bits
+    (cart badge, messages, CSRF token) punched out and filled per request.
+
+    Goes inside @conditional_page, whose validators key the entry: a catalog
+    change or a new validator value means a new key. A hit still costs the
+    page's validator query (see views.py) plus one cache read.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        parts = getattr(request, 'page_validators', None)
+        if request.method not in ('GET', 'HEAD') or parts is None or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        digest = hashlib.md5(repr((parts, request.get_full_path())).encode(), usedforsecurity=False).hexdigest()
+        key = catalog_key(f'page:{digest}')
+        cached = cache.get(key)
+        if cached is None:
+            csrf_used = request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            request._punch_holes = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request._punch_holes = False
+            # Only plain 200s, and not if something outside a hole asked for
+            # a CSRF token or set a cookie - that render is per visitor
+            if (response.status_code != 200 or response.streaming or response.cookies
+                    or request.META.get('CSRF_COOKIE_NEEDS_UPDATE') != csrf_used):
+                if not response.streaming:
+                    response.content = fill_holes(request, response.content.decode(response.charset))
+                return response
+            cached = (response.content.decode(response.charset), response['Content-Type'])
+            cache.set(key, cached, PAGE_CACHE_TIMEOUT)
+
+        html, content_type = cached
+        return HttpResponse(fill_holes(request, html), content_type=content_type)
+    return wrapper
@@ -0,0 +1,133 @@
+# pagination.py - Keyset (cursor) pagination
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+CURSOR_SALT = 'vastramapp.pagination'
+DEFAULT_PAGE_SIZE = 24
+
+
+class KeysetPage:
+    """One page of results plus opaque cursors for its neighbours."""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def encode_cursor(direction, values):
+    return signing.dumps([direction, [str(v) for v in values]], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    """Return (direction, raw values) or (None, None) for a missing/bad cursor."""
+    if not cursor:
+        return None, None
+    try:
+        direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None, None
+    if direction not in ('next', 'prev'):
+        return None, None
+    return direction, values
+
+
+def _field_name(ordering):
+    return ordering.lstrip('-')
+
+
+def _keyset_filter(ordering, values, reverse=False):
+    """Build "row comes after `values`" for an ORDER BY of `ordering`.
+
+    For ('-created_at', '-id') that is
+    created_at < v0 OR (created_at = v0 AND id < v1).
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        descending = field.startswith('-')
+        if reverse:
+            descending = not descending
+        lookup = 'lt' if descending else 'gt'
+        clause = Q(**{f'{_field_name(field)}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{_field_name(prev_field): prev_value})
+        condition |= clause
+    return condition
+
+
+def _reverse_ordering(ordering):
+    return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in ordering)
+
+
+def _row_values(obj, ordering):
+    return [getattr(obj, _field_name(f)) for f in ordering]
+
+
+def paginate_queryset(queryset, ordering, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """Return a KeysetPage of `queryset` ordered by `ordering`.
+
+    `ordering` must end in a unique column (normally id) so every row has a
+    distinct position. Each page is a single indexed range query of
+    per_page + 1 rows - no OFFSET and no COUNT(*).
+    """
+    ordering = tuple(ordering)
+    model = queryset.model
+    direction, raw_values = decode_cursor(cursor)
+
+    values = None
+    if raw_values is not None and len(raw_values) == len(ordering):
+        try:
+            values = [
+                model._meta.get_field(_field_name(f)).to_python(v)
+                for f, v in zip(ordering, raw_values)
+            ]
+        except (FieldDoesNotExist, ValidationError):
+            values = None
+    if values is None:
+        direction = None
+
+    if direction == 'prev':
+        rows = list(
+            queryset.filter(_keyset_filter(ordering, values, reverse=True))
+            .order_by(*_reverse_ordering(ordering))[:per_page + 1]
+        )
+        has_more = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        has_next = True
+        has_previous = has_more
+    else:
+        if direction == 'next':
+            queryset = queryset.filter(_keyset_filter(ordering, values))
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        items = rows[:per_page]
+        has_next = len(rows) > per_page
+        has_previous = direction == 'next'
+
+    next_cursor = previous_cursor = None
+    if items and has_next:
+        next_cursor = encode_cursor('next', _row_values(items[-1], ordering))
+    if items and has_previous:
+        previous_cursor = encode_cursor('prev', _row_values(items[0], ordering))
+    return KeysetPage(items, next_cursor, previous_cursor)
@@ -0,0 +1,150 @@
+# recommendations.py - Incremental co-purchase recommendations
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .db import retry_on_locked
+from .models import OrderItem, Order, ProductCooccurrence, ProductRecommendation, RollupState, Wishlist
+from .rollups import EXCLUDED_STATUSES, settle_delay
+
+STATE_NAME = 'co_purchase'
+
+# Neighbours kept per product; more than the page shows, so a deactivated
+# product or two doesn't leave gaps
+TOP_K = 12
+
+# A shared order says more than a shared wishlist
+ORDER_WEIGHT = 2
+WISHLIST_WEIGHT = 1
+
+# Keeps IN (...) lists well under SQLite's variable limit
+CHUNK = 500
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK):
+        yield values[i:i + CHUNK]
+
+
+def _order_pairs(orders):
+    """{(a, b): orders containing both} for a < b, over `orders`.
+
+    The self-join on order items is the sparse AᵀA product of the
+    order x product matrix, computed by the database in one query.
+    """
+    rows = (
+        OrderItem.objects.filter(order__in=orders)
+        .annotate(other=F('order__orderitem__product_id'))
+        .filter(other__gt=F('product_id'))
+        .values('product_id', 'other')
+        .annotate(n=Count('order_id', distinct=True))
+        .order_by()
+    )
+    return {(row['product_id'], row['other']): row['n'] for row in rows}
+
+
+def _wishlist_pairs(wishlist):
+    """{(a, b): users} for each new wishlist row paired with the user's
+    older ones, so a pair is only counted when its second item arrives."""
+    rows = (
+        wishlist.filter(user__isnull=False)
+        .annotate(other=F('user__wishlist__product_id'), other_row=F('user__wishlist__id'))
+        .filter(other_row__lt=F('id'))
+        .values('product_id', 'other')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    pairs = defaultdict(int)
+    for row in rows:
+        pairs[tuple(sorted((row['product_id'], row['other'])))] += row['n']
+    return pairs
+
+
+def _merge(deltas):
+    """Add {(product, other): weight} onto ProductCooccurrence."""
+    to_create, to_update = [], []
+    by_product = defaultdict(dict)
+    for (product, other), weight in deltas.items():
+        by_product[product][other] = weight
+    for products in _chunks(by_product):
+        existing = {
+            (cell.product_id, cell.other_id): cell
+            for cell in ProductCooccurrence.objects.filter(product_id__in=products)
+        }
+        for product in products:
+            for other, weight in by_product[product].items():
+                cell = existing.get((product, other))
+                if cell is None:
+                    to_create.append(ProductCooccurrence(product_id=product, other_id=other, weight=weight))
+                else:
+                    cell.weight += weight
+                    to_update.append(cell)
+    ProductCooccurrence.objects.bulk_create(to_create, batch_size=CHUNK)
+    ProductCooccurrence.objects.bulk_update(to_update, ['weight'], batch_size=CHUNK)
+
+
+def _refresh_top_k(products):
+    """Recompute the stored neighbour lists of `products`."""
+    for chunk in _chunks(products):
+        cells = (
+            ProductCooccurrence.objects.filter(product_id__in=chunk)
+            .order_by('product_id', '-weight', 'other_id')
+            .values_list('product_id', 'other_id')
+        )
+        ranked = defaultdict(list)
+        for product, other in cells:
+            if len(ranked[product]) < TOP_K:
+                ranked[product].append(other)
+        ProductRecommendation.objects.filter(product_id__in=chunk).delete()
+        ProductRecommendation.objects.bulk_create([
+            ProductRecommendation(product_id=product, recommended_id=other, rank=rank)
+            for product, others in ranked.items()
+            for rank, other in enumerate(others)
+        ], batch_size=CHUNK)
+
+
+@retry_on_locked
+def update_recommendations(now=None):
+    """Fold orders and wishlist additions since the high-water mark into
+    the co-occurrence counts, then re-rank only the products they touched.
+    Returns (orders processed, products re-ranked)."""
+    cutoff = (now or timezone.now()) - settle_delay()
+    with transaction.atomic():
+        state, _ = RollupState.objects.select_for_update().get_or_create(name=STATE_NAME)
+        if state.high_water_mark and state.high_water_mark >= cutoff:
+            return 0, 0
+
+        orders = Order.objects.filter(created_at__lte=cutoff).exclude(status__in=EXCLUDED_STATUSES)
+        wishlist = Wishlist.objects.filter(created_at__lte=cutoff)
+        if state.high_water_mark:
+            orders = orders.filter(created_at__gt=state.high_water_mark)
+            wishlist = wishlist.filter(created_at__gt=state.high_water_mark)
+
+        deltas = defaultdict(int)
+        for pairs, weight in ((_order_pairs(orders), ORDER_WEIGHT), (_wishlist_pairs(wishlist), WISHLIST_WEIGHT)):
+            for (a, b), n in pairs.items():
+                deltas[(a, b)] += n * weight
+                deltas[(b, a)] += n * weight
+        _merge(deltas)
+        touched = {product for product, other in deltas}
+        _refresh_top_k(touched)
+
+        state.high_water_mark = cutoff
+        state.save()
+        if touched:
+            # Cached product pages show the neighbours
+            transaction.on_commit(bump_catalog_version)
+    return orders.count(), len(touched)
+
+
+def rebuild_recommendations(now=None):
+    """Throw the matrix away and count every order and wishlist row again."""
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductCooccurrence.objects.all().delete()
+        RollupState.objects.filter(name=STATE_NAME).delete()
+        return update_recommendations(now)
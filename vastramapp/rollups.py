@@ -0,0 +1,134 @@
+# rollups.py - Incremental daily sales rollups
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .db import retry_on_locked
+from .models import DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem, RollupState
+
+ROLLUP_NAME = 'daily_sales'
+
+# Orders in these states never count as sales
+EXCLUDED_STATUSES = ('cancelled',)
+
+REVENUE = DecimalField(max_digits=14, decimal_places=2)
+
+
+def settle_delay():
+    # Order.created_at is stamped before the checkout transaction commits, so
+    # stay a little behind "now" or a slow checkout could land below the mark
+    return timedelta(seconds=getattr(settings, 'SALES_ROLLUP_SETTLE_SECONDS', 60))
+
+
+def _merge(model, key_fields, rows):
+    """Add {key: {field: delta}} onto the rollup rows of `model`, creating
+    the ones that don't exist yet. The first key field is always the date."""
+    if not rows:
+        return
+    existing = {
+        tuple(getattr(obj, f) for f in key_fields): obj
+        for obj in model.objects.filter(date__in={key[0] for key in rows})
+    }
+    to_create, to_update = [], []
+    for key, deltas in rows.items():
+        obj = existing.get(key)
+        if obj is None:
+            to_create.append(model(**dict(zip(key_fields, key)), **deltas))
+        else:
+            for field, delta in deltas.items():
+                setattr(obj, field, getattr(obj, field) + delta)
+            to_update.append(obj)
+    model.objects.bulk_create(to_create)
+    if to_update:
+        model.objects.bulk_update(to_update, list(next(iter(rows.values()))))
+
+
+@retry_on_locked
+def update_rollups(now=None):
+    """Fold orders created since the high-water mark into the daily tables.
+
+    Only the new window of orders is aggregated, and the tables plus the mark
+    move together in one transaction, so a run is never counted twice.
+    Returns the number of orders rolled up.
+    """
+    cutoff = (now or timezone.now()) - settle_delay()
+    with transaction.atomic():
+        state, _ = RollupState.objects.select_for_update().get_or_create(name=ROLLUP_NAME)
+        if state.high_water_mark and state.high_water_mark >= cutoff:
+            return 0
+
+        orders = Order.objects.filter(created_at__lte=cutoff).exclude(status__in=EXCLUDED_STATUSES)
+        if state.high_water_mark:
+            orders = orders.filter(created_at__gt=state.high_water_mark)
+
+        daily = defaultdict(lambda: {'order_count': 0, 'units': 0, 'revenue': 0})
+        order_count = 0
+        for row in (orders.annotate(day=TruncDate('created_at')).values('day')
+                    .annotate(n=Count('id'), revenue=Sum('total_amount')).order_by()):
+            daily[(row['day'],)].update(order_count=row['n'], revenue=row['revenue'])
+            order_count += row['n']
+
+        per_product, per_category = {}, defaultdict(lambda: {'units': 0, 'revenue': 0})
+        items = (
+            OrderItem.objects.filter(order__in=orders)
+            .annotate(day=TruncDate('order__created_at'))
+            .values('day', 'product_id', 'product__category_id')
+            .annotate(units=Sum('quantity'), revenue=Sum(F('price') * F('quantity'), output_field=REVENUE))
+            .order_by()
+        )
+        for row in items:
+            day, units, revenue = row['day'], row['units'], row['revenue']
+            per_product[(day, row['product_id'])] = {'units': units, 'revenue': revenue}
+            per_category[(day, row['product__category_id'])]['units'] += units
+            per_category[(day, row['product__category_id'])]['revenue'] += revenue
+            daily[(day,)]['units'] += units
+
+        _merge(DailySales, ('date',), daily)
+        _merge(DailyProductSales, ('date', 'product_id'), per_product)
+        _merge(DailyCategorySales, ('date', 'category_id'), dict(per_category))
+
+        state.high_water_mark = cutoff
+        state.save()
+    return order_count
+
+
+def rebuild_rollups(now=None):
+    """Throw the rollups away and aggregate every order again."""
+    with transaction.atomic():
+        for model in (DailySales, DailyProductSales, DailyCategorySales):
+            model.objects.all().delete()
+        RollupState.objects.filter(name=ROLLUP_NAME).delete()
+        return update_rollups(now)
+
+
+def dashboard_data(days=30):
+    """Everything the sales dashboard shows, read from the rollups only."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = DailySales.objects.filter(date__gte=since).aggregate(
+        orders=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'),
+    )
+    top_products = (
+        DailyProductSales.objects.filter(date__gte=since)
+        .values('product_id', 'product__name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')[:10]
+    )
+    top_categories = (
+        DailyCategorySales.objects.filter(date__gte=since)
+        .values('category_id', 'category__name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')
+    )
+    return {
+        'days': days,
+        'since': since,
+        'totals': totals,
+        'top_products': list(top_products),
+        'top_categories': list(top_categories),
+        'rollup_state': RollupState.objects.filter(name=ROLLUP_NAME).first(),
+    }
@@ -0,0 +1,55 @@
+# routers.py - Keep write-heavy log tables out of the main database
+from django.conf import settings
+
+LOG_DATABASE = 'logs'
+
+# Append-mostly tables that take a write on nearly every request. In their own
+# SQLite file they have their own write lock, so they never queue behind (or
+# hold up) checkout transactions on the main database.
+LOG_MODELS = {
+    'vastramapp.userloginhistory',
+    'vastramapp.contactquery',
+    'sessions.session',
+}
+
+
+def is_log_model(app_label, model_name):
+    return f'{app_label}.{model_name}' in LOG_MODELS
+
+
+def log_database_enabled():
+    return LOG_DATABASE in settings.DATABASES
+
+
+class LogDatabaseRouter:
+    """Routes LOG_MODELS to the `logs` database and everything else to
+    `default`. Without a `logs` entry in DATABASES it routes nothing."""
+
+    def _db_for(self, model):
+        if not log_database_enabled():
+            return None
+        if is_log_model(model._meta.app_label, model._meta.model_name):
+            return LOG_DATABASE
+        # Explicit, otherwise Django would follow a log row's database when
+        # resolving its user foreign key
+        return 'default'
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # UserLoginHistory.user crosses databases (it has no DB constraint)
+        if any(is_log_model(o._meta.app_label, o._meta.model_name) for o in (obj1, obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not log_database_enabled():
+            return None
+        if model_name is None:
+            # RunPython/RunSQL operations belong to the main database
+            return db == 'default'
+        return (db == LOG_DATABASE) == is_log_model(app_label, model_name)
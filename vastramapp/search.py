@@ -0,0 +1,180 @@
+# search.py - SQLite FTS5 product search index
+import re
+
+from django.db import connection, OperationalError, transaction
+from django.db.models.expressions import RawSQL
+
+from .pagination import DEFAULT_PAGE_SIZE, KeysetPage, decode_cursor, encode_cursor
+
+FTS_TABLE = 'vastramapp_product_fts'
+
+# bm25() column weights: name, description, category
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+CREATE_SQL = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+# Only active products are indexed, so search never has to join back to
+# filter on is_active
+POPULATE_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, description, category)
+    SELECT p.id, p.name, p.description, c.name
+    FROM vastramapp_product p
+    JOIN vastramapp_category c ON c.id = p.category_id
+    WHERE p.is_active
+"""
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query):
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term ("kur"* matches kurta), and terms
+    are ANDed together. Returns None when nothing searchable is left.
+    """
+    tokens = _TOKEN_RE.findall(query or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def index_product(product):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+        if product.is_active:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)",
+                [product.pk, product.name, product.description, product.category.name]
+            )
+
+
+def remove_product(product_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def reindex_category(category):
+    """Refresh the denormalised category name on all of its products."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {FTS_TABLE} SET category = %s WHERE rowid IN "
+            f"(SELECT id FROM vastramapp_product WHERE category_id = %s)",
+            [category.name, category.pk]
+        )
+
+
+def rebuild_index():
+    """Drop and repopulate the whole index. Returns number of indexed rows.
+
+    Runs in one transaction (SQLite DDL is transactional), so other
+    connections keep searching the old table until the new one commits, and
+    a failed rebuild leaves the old one in place.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+        cursor.execute(CREATE_SQL)
+        cursor.execute(POPULATE_SQL)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def matching_ids(query):
+    """Subquery of the product ids matching `query`, for `id__in=`."""
+    match = build_match_query(query)
+    if match is None:
+        return RawSQL('SELECT NULL WHERE 0', [])
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+
+
+def search_product_ids(query, limit, after=None, before=None, within=None):
+    """Return BM25-ranked (product_id, score) pairs for `query`, best first.
+
+    Rows are ordered by (score, rowid), so the (score, id) of a boundary row
+    works as a keyset cursor: `after` continues forward from it, `before`
+    walks backwards (results are still returned best first). Fetches one row
+    more than `limit` so callers can tell whether there is another page
+    without running a COUNT(*). `within` (a Product queryset) limits the
+    matches to its rows, e.g. the ones passing the listing filters.
+    """
+    match = build_match_query(query)
+    if match is None:
+        return []
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    sql = (
+        f"SELECT rowid, score FROM ("
+        f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [match]
+    if within is not None:
+        within_sql, within_params = within.values('id').query.sql_with_params()
+        sql += f" AND rowid IN ({within_sql})"
+        params += list(within_params)
+    sql += ")"
+    if after is not None:
+        sql += " WHERE score > %s OR (score = %s AND rowid > %s) ORDER BY score, rowid"
+        params += [after[0], after[0], after[1]]
+    elif before is not None:
+        sql += " WHERE score < %s OR (score = %s AND rowid < %s) ORDER BY score DESC, rowid DESC"
+        params += [before[0], before[0], before[1]]
+    else:
+        sql += " ORDER BY score, rowid"
+    sql += " LIMIT %s"
+    params.append(limit + 1)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    except OperationalError:
+        # Malformed expression or index missing - behave like "no results"
+        return []
+    if before is not None:
+        # Keep the extra look-ahead row last, like the forward case
+        rows = rows[:limit][::-1] + rows[limit:]
+    return rows
+
+
+def search_page(query, cursor=None, per_page=DEFAULT_PAGE_SIZE, within=None):
+    """KeysetPage of ranked (product_id, score) pairs for `query`."""
+    direction, values = decode_cursor(cursor)
+    after = before = None
+    try:
+        if direction == 'next':
+            after = (float(values[0]), int(values[1]))
+        elif direction == 'prev':
+            before = (float(values[0]), int(values[1]))
+    except (IndexError, TypeError, ValueError):
+        direction = None
+
+    rows = search_product_ids(query, per_page, after=after, before=before, within=within)
+    items = rows[:per_page]
+    has_more = len(rows) > per_page
+    if direction == 'prev':
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, direction == 'next'
+
+    next_cursor = previous_cursor = None
+    if items and has_next:
+        next_cursor = encode_cursor('next', [items[-1][1], items[-1][0]])
+    if items and has_previous:
+        previous_cursor = encode_cursor('prev', [items[0][1], items[0][0]])
+    return KeysetPage(items, next_cursor, previous_cursor)
@@ -0,0 +1,59 @@
+# signals.py - Cache invalidation hooks
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import images, search
+from .cache import bump_catalog_version, invalidate_cart
+from .cart import merge_session_cart
+from .models import Product, Category, Slider, SpecialOffer, Cart, Event, UserLoginHistory
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Slider)
+@receiver([post_save, post_delete], sender=SpecialOffer)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if not created:
+        search.reindex_category(instance)
+
+
+@receiver([post_save, post_delete], sender=Cart)
+def invalidate_cart_cache(sender, instance, **kwargs):
+    invalidate_cart(instance.user_id)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request.session, user)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Slider)
+@receiver(post_save, sender=Event)
+def generate_image_derivatives(sender, instance, **kwargs):
+    images.schedule_derivatives(instance, images.IMAGE_FIELDS[sender._meta.label])
+
+
+# Login history lives in another database, so the ORM can't cascade to it
+@receiver(post_delete, sender=User)
+def delete_login_history(sender, instance, **kwargs):
+    UserLoginHistory.objects.filter(user_id=instance.pk).delete()
@@ -0,0 +1,142 @@
+# suggest.py - In-process prefix index for search-as-you-type suggestions
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+from itertools import groupby
+
+from django.db.models import Q, Sum
+from django.urls import reverse
+
+from .cache import get_catalog_version
+from .models import Category, Product
+
+URL_NAMES = {'product': 'product_detail', 'category': 'category_products'}
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# Prefixes this short match a big slice of the catalog, so their answers
+# are worked out when the index is built instead of per keystroke
+PRECOMPUTED_PREFIX = 2
+
+# Answers for longer prefixes are memoized per index, up to this many
+MEMO_SIZE = 4096
+
+# Checkout raises sales_count with update(), which doesn't bump the catalog
+# version, so the ranking is also rebuilt once the index is this old (seconds)
+INDEX_MAX_AGE = 60 * 15
+
+# Past the last character any name can contain, for the end of a prefix range
+_HIGH = '\U0010ffff'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(_TOKEN_RE.findall(text.casefold()))
+
+
+class PrefixIndex:
+    """Active product and category names, matched on the start of any word.
+
+    Entries are numbered best first by sales (a category counts its active
+    products' sales), so the top N completions of a prefix are just the N
+    smallest entry numbers in its bisect range of the sorted word-suffix keys.
+    """
+
+    def __init__(self, entries, version=None):
+        # entries: (label, kind, object id, popularity)
+        self.version = version
+        self.built_at = time.monotonic()
+        self.entries = sorted(entries, key=lambda e: (-e[3], e[1], e[0].casefold()))
+        keys = sorted(
+            (suffix, number)
+            for number, (label, kind, pk, popularity) in enumerate(self.entries)
+            for suffix in self._suffixes(label)
+        )
+        self.keys = [key for key, number in keys]
+        self.numbers = [number for key, number in keys]
+        self.memo = {}
+        self.urls = {}
+        self.short = {}
+        for length in range(1, PRECOMPUTED_PREFIX + 1):
+            for prefix, group in groupby(keys, key=lambda k: k[0][:length]):
+                if len(prefix) == length:
+                    self.short[prefix] = nsmallest(MAX_LIMIT, {number for key, number in group})
+
+    @staticmethod
+    def _suffixes(label):
+        words = normalize(label).split()
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def numbers_for(self, prefix):
+        if prefix in self.short:
+            return self.short[prefix]
+        numbers = self.memo.get(prefix)
+        if numbers is None:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_right(self.keys, prefix + _HIGH, start)
+            numbers = nsmallest(MAX_LIMIT, set(self.numbers[start:end]))
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            self.memo[prefix] = numbers
+        return numbers
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        suggestions = []
+        for number in self.numbers_for(prefix)[:limit]:
+            label, kind, pk, popularity = self.entries[number]
+            url = self.urls.get(number)
+            if url is None:
+                url = self.urls[number] = reverse(URL_NAMES[kind], args=[pk])
+            suggestions.append({'label': label, 'kind': kind, 'url': url})
+        return suggestions
+
+
+def build_index(version=None):
+    products = Product.objects.filter(is_active=True).values_list('name', 'id', 'sales_count')
+    categories = Category.objects.annotate(
+        sales=Sum('product__sales_count', filter=Q(product__is_active=True))
+    ).values_list('name', 'id', 'sales')
+    return PrefixIndex(
+        [(name, 'category', pk, sales or 0) for name, pk, sales in categories]
+        + [(name, 'product', pk, sales) for name, pk, sales in products],
+        version,
+    )
+
+
+# Process-local index, rebuilt when the catalog version moves or it ages out
+_index = {'index': None}
+_build_lock = threading.Lock()
+
+
+def _is_current(index, version):
+    return (index is not None and index.version == version
+            and time.monotonic() - index.built_at < INDEX_MAX_AGE)
+
+
+def get_index():
+    """The current PrefixIndex, built on first use in this process.
+
+    A catalog change (see signals.py) bumps the version, which rebuilds the
+    index on the next request. Sales from checkout don't bump it, so the
+    ranking can lag them by up to INDEX_MAX_AGE. A rebuild runs in one
+    request while any others keep answering from the old index.
+    """
+    version = get_catalog_version()
+    index = _index['index']
+    if _is_current(index, version):
+        return index
+    if not _build_lock.acquire(blocking=index is None):
+        return index
+    try:
+        if not _is_current(_index['index'], version):
+            _index['index'] = build_index(version)
+        return _index['index']
+    finally:
+        _build_lock.release()
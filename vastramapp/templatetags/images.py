@@ -0,0 +1,40 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from vastramapp.images import variants_field
+
+register = template.Library()
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def _srcset(entries):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for name, width, height in entries)
+
+
+@register.simple_tag
+def responsive_image(fieldfile, sizes='100vw', loading='lazy', **attrs):
+    """Render an image field as <picture> with AVIF/WebP srcsets.
+
+    Usage: {% responsive_image product.image sizes="(max-width: 576px) 50vw, 25vw" class="w-100" alt=product.name %}
+
+    Falls back to a plain lazy <img> until derivatives have been generated.
+    """
+    if not fieldfile:
+        return ''
+    img_attrs = {'src': fieldfile.url, 'loading': loading, 'decoding': 'async', **attrs}
+    img = format_html('<img{}>', format_html_join('', ' {}="{}"', img_attrs.items()))
+
+    variants = getattr(fieldfile.instance, variants_field(fieldfile.field.name), None) or {}
+    if variants.get('source') != fieldfile.name:
+        return img
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (MIME_TYPES.get(fmt, f'image/{fmt}'), _srcset(entries), sizes)
+            for fmt, entries in variants.get('formats', {}).items() if entries
+        )
+    )
+    return format_html('<picture>{}{}</picture>', sources, img)
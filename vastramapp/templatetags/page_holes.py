@@ -0,0 +1,21 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from vastramapp.page_cache import HOLE_MARKER, punching_holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name):
+    """Render a per-visitor partial (cart badge, messages, CSRF token).
+
+    Usage: {% hole "partials/messages.html" %}
+
+    While a page is rendered for the anonymous page cache this leaves a
+    marker instead, filled in for each visitor after the cache lookup.
+    The partial only sees context processor values when it is filled.
+    """
+    if punching_holes(context.get('request')):
+        return mark_safe(HOLE_MARKER.format(template_name))
+    return context.template.engine.get_template(template_name).render(context)
@@ -1,3 +1,1123 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, features
+
+from .models import *
+from .login_history import LoginHistoryWriter
+from .cache import get_catalog_version
+from .cart import DatabaseCart, merge_session_cart
+from .checkout import OutOfStockError, place_order
+from .catalog_import import CatalogImporter
+from .facets import ProductFilters
+from .pagination import paginate_queryset
+from . import images, recommendations, rollups, search, suggest
+from .db import retry_on_locked
+from . import urls as app_urls
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+_test_caches = override_settings(CACHES=TEST_CACHES)
+
+
+def setUpModule():
+    # Every test uses a process-local cache, never the project's cache/ dir
+    _test_caches.enable()
+
+
+def tearDownModule():
+    _test_caches.disable()
+
+# Wall-clock ceiling for one request through the test client. Generous on
+# purpose - it catches pathological renders, not a few ms of CI noise.
+RENDER_BUDGET_SECONDS = 0.5
+
+SHIPPING = {
+    'full_name': 'Test Buyer',
+    'phone': '9999999999',
+    'address': '1 MG Road',
+    'city': 'Pune',
+    'state': 'MH',
+    'pincode': '411001',
+}
+
+
+class CaptureAllQueries:
+    """CaptureQueriesContext across every database, since sessions and login
+    history live in `logs`."""
+
+    def __enter__(self):
+        self.contexts = [CaptureQueriesContext(connections[alias]) for alias in connections]
+        for ctx in self.contexts:
+            ctx.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for ctx in self.contexts:
+            ctx.__exit__(*exc_info)
+
+    @property
+    def captured_queries(self):
+        return [q for ctx in self.contexts for q in ctx.captured_queries]
+
+    def __len__(self):
+        return len(self.captured_queries)
+
+
+class QueryBudgetTests(TestCase):
+    """Every URL in vastramapp/urls.py gets a fixed query ceiling.
+
+    The fixture has several rows behind every listing, so an N+1 in a view
+    or template pushes the count over budget and fails the build.
+    """
+    databases = {'default', 'logs'}
+
+    # url name -> (method, login required, max queries). Pages with
+    # conditional GET support pay one extra query for their validators.
+    BUDGETS = {
+        'home': ('get', False, 5),
+        'product_detail': ('get', False, 4),  # no recommendations yet, so + the category fallback
+        'category_products': ('get', False, 4),  # + the facet counts
+        'search_products': ('get', False, 1),
+        'search_suggestions': ('get', False, 2),  # cache.clear() moved the version, so a rebuild
+        'signup': ('get', False, 0),
+        'login': ('get', False, 0),
+        'logout': ('get', True, 4),
+        'cart': ('get', True, 3),
+        'add_to_cart': ('post', True, 7),
+        'remove_from_cart': ('post', True, 4),
+        'update_cart_quantity': ('post', True, 4),
+        'wishlist': ('get', True, 3),
+        'add_to_wishlist': ('get', True, 7),
+        'remove_from_wishlist': ('get', True, 4),
+        'checkout': ('get', True, 3),
+        'order_history': ('get', True, 6),
+        'submit_feedback': ('post', True, 4),
+        'about_us': ('get', False, 1),
+        'contact_us': ('get', False, 0),
+        'events': ('get', False, 2),
+        'profile': ('get', True, 4),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pass12345')
+        cls.categories = [
+            Category.objects.create(name=name, description=f'{name} collection')
+            for name in ('Kurta', 'Sherwani', 'Blazer')
+        ]
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f'{category.name} {i}',
+                description=f'Handwoven {category.name.lower()} number {i}',
+                actual_price=1000 + i * 100,
+                special_price=800 + i * 50,
+                image='products/test.png',
+                stock=50,
+                sales_count=i,
+            )
+            for category in cls.categories
+            for i in range(4)
+        ]
+        for category in cls.categories[:2]:
+            Slider.objects.create(title=f'{category.name} sale', description='Sale', image='sliders/test.png', category=category)
+        SpecialOffer.objects.create(title='Festive', description='Festive offer', discount_percentage=10)
+        for i in range(2):
+            Event.objects.create(title=f'Event {i}', description='Shakha', image='events/test.png', event_date=timezone.now().date())
+        AboutUs.objects.create(title='About', content='Swadeshi clothing')
+
+        address = ShippingAddress.objects.create(user=cls.user, **SHIPPING)
+        cls.orders = []
+        for status in ('delivered', 'delivered', 'pending'):
+            order = Order.objects.create(user=cls.user, shipping_address=address, status=status, total_amount=3000)
+            for product in cls.products[:3]:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.special_price)
+            cls.orders.append(order)
+        OrderFeedback.objects.create(order=cls.orders[0], rating=5, comment='Great')
+
+        cls.cart_items = [Cart.objects.create(user=cls.user, product=p, quantity=1) for p in cls.products[3:6]]
+        cls.wishlist_items = [Wishlist.objects.create(user=cls.user, product=p) for p in cls.products[6:8]]
+
+    def setUp(self):
+        cache.clear()
+
+    def request_args(self, name):
+        """URL kwargs and POST data for each named route."""
+        args = {
+            'product_detail': ([self.products[0].id], None),
+            'category_products': ([self.categories[0].id], None),
+            'add_to_cart': ([self.products[0].id], None),
+            'remove_from_cart': ([self.cart_items[0].product_id], None),
+            'update_cart_quantity': ([self.cart_items[1].product_id], {'quantity': 2}),
+            'add_to_wishlist': ([self.products[9].id], None),
+            'remove_from_wishlist': ([self.wishlist_items[0].id], None),
+            'submit_feedback': ([self.orders[1].id], {'rating': 4, 'comment': 'Nice'}),
+        }
+        return args.get(name, ([], None))
+
+    def warm_shared_caches(self):
+        # Steady state for the nav categories and cart badge; contact_us runs
+        # no queries of its own
+        self.client.get(reverse('contact_us'))
+
+    def measure(self, method, url, data=None):
+        with CaptureAllQueries() as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data or {})
+            elapsed = time.perf_counter() - started
+        return response, queries, elapsed
+
+    def assertWithinBudget(self, response, queries, elapsed, max_queries):
+        self.assertLess(response.status_code, 400)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            '\n'.join(q['sql'] for q in queries.captured_queries)
+        )
+        self.assertLess(elapsed, RENDER_BUDGET_SECONDS)
+
+    def test_every_url_has_a_budget(self):
+        names = {p.name for p in app_urls.urlpatterns}
+        self.assertEqual(names, set(self.BUDGETS))
+
+    def test_url_query_budgets(self):
+        for name, (method, needs_login, max_queries) in self.BUDGETS.items():
+            with self.subTest(url=name):
+                cache.clear()
+                self.client.logout()
+                if needs_login:
+                    self.client.force_login(self.user)
+                self.warm_shared_caches()
+                args, data = self.request_args(name)
+                response, queries, elapsed = self.measure(method, reverse(name, args=args), data)
+                self.assertWithinBudget(response, queries, elapsed, max_queries)
+
+    def test_home_warm_cache_runs_no_queries(self):
+        self.client.get(reverse('home'))
+        response, queries, elapsed = self.measure('get', reverse('home'))
+        self.assertWithinBudget(response, queries, elapsed, 0)
+
+    def test_search_with_query(self):
+        response, queries, elapsed = self.measure('get', reverse('search_products'), {'q': 'kurta'})
+        self.assertWithinBudget(response, queries, elapsed, 4)
+        self.assertContains(response, 'Kurta 0')
+
+    def test_checkout_post(self):
+        self.client.force_login(self.user)
+        response, queries, elapsed = self.measure('post', reverse('checkout'), SHIPPING)
+        self.assertRedirects(response, reverse('order_history'), fetch_redirect_response=False)
+        self.assertWithinBudget(response, queries, elapsed, 14)
+
+    def test_explain_views_finds_no_full_scans(self):
+        out = StringIO()
+        call_command('explain_views', '--fail-on-scan', user=self.user.username, stdout=out)
+        self.assertIn('No full table scans', out.getvalue())
+
+    def test_order_history_does_not_grow_with_orders(self):
+        self.client.force_login(self.user)
+        self.warm_shared_caches()
+        _, before, _ = self.measure('get', reverse('order_history'))
+        order = Order.objects.create(user=self.user, total_amount=100)
+        for product in self.products[4:8]:
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=product.special_price)
+        _, after, _ = self.measure('get', reverse('order_history'))
+        self.assertEqual(len(before), len(after))
+
+    def test_final_order_summaries_are_cached(self):
+        self.client.force_login(self.user)
+        Order.objects.filter(user=self.user).update(status='delivered')
+        self.client.get(reverse('order_history'))
+        response, queries, _ = self.measure('get', reverse('order_history'))
+        self.assertContains(response, self.orders[0].order_id)
+        self.assertFalse([q for q in queries.captured_queries if 'vastramapp_orderitem' in q['sql']])
+
+
+class RequestProfilingTests(TestCase):
+    databases = {'default', 'logs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name='Kurta')
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('about_us'))
+        timing = response['Server-Timing']
+        for metric in ('db;', 'tpl;', 'view;', 'total;'):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="\d+ queries"')
+
+    @override_settings(PROFILING_SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_with_top_queries(self):
+        with self.assertLogs('vastramapp.slow_requests', level='WARNING') as logs:
+            self.client.get(reverse('about_us'))
+        self.assertIn('view=about_us', logs.output[0])
+        self.assertIn('vastramapp_aboutus', logs.output[0])
+
+
+
+class AdminChangelistTests(TestCase):
+    databases = {'default', 'logs'}
+    CHANGELISTS = ['auth_user', 'vastramapp_order', 'vastramapp_product', 'vastramapp_userloginhistory', 'vastramapp_orderfeedback']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        cls.category = Category.objects.create(name='Kurta', description='Kurtas')
+
+    def add_rows(self, n):
+        for i in range(n):
+            user = User.objects.create_user(f'user{User.objects.count()}')
+            UserLoginHistory.objects.create(user=user, ip_address='127.0.0.1', user_agent='ua', device_id='d')
+            product = Product.objects.create(category=self.category, name=f'Kurta {user.pk}', description='Kurta',
+                                             actual_price=1000, special_price=900, image='products/test.png', stock=5)
+            address = ShippingAddress.objects.create(user=user, **SHIPPING)
+            order = Order.objects.create(user=user, shipping_address=address, total_amount=900)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=900)
+            OrderFeedback.objects.create(order=order, rating=4, comment='Good')
+
+    def changelist_queries(self):
+        counts = {}
+        for name in self.CHANGELISTS:
+            with CaptureAllQueries() as ctx:
+                response = self.client.get(reverse(f'admin:{name}_changelist'))
+            self.assertEqual(response.status_code, 200)
+            counts[name] = len(ctx)
+        return counts
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('admin:index'))  # warm nav/cart badge caches
+        self.add_rows(2)
+        before = self.changelist_queries()
+        self.add_rows(8)
+        self.assertEqual(self.changelist_queries(), before)
+
+    def export_orders(self, action):
+        with CaptureAllQueries() as ctx:
+            response = self.client.post(reverse('admin:vastramapp_order_changelist'),
+                                        {'action': action, 'select_across': 1, 'index': 0,
+                                         '_selected_action': Order.objects.values_list('pk', flat=True)[:1]})
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        return lines, len(ctx)
+
+    def test_export_action_streams_with_flat_queries(self):
+        self.client.force_login(self.admin)
+        self.add_rows(2)
+        lines, queries = self.export_orders('export_csv')
+        self.assertEqual(len(lines), 3)  # header + one item per order
+        self.assertIn('Kurta', lines[1])
+        self.add_rows(8)
+        lines, more_queries = self.export_orders('export_jsonl')
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(json.loads(lines[0])['feedback'], {'rating': 4, 'comment': 'Good'})
+        self.assertEqual(more_queries, queries)
+
+    def test_login_history_search_keeps_filters(self):
+        self.client.force_login(self.admin)
+        meera = User.objects.create_user('meera')
+        old = UserLoginHistory.objects.create(user=meera, ip_address='10.0.0.1', login_time=timezone.now() - timezone.timedelta(days=400))
+        recent = UserLoginHistory.objects.create(user=meera, ip_address='10.0.0.2')
+        since = timezone.now() - timezone.timedelta(days=7)
+        response = self.client.get(reverse('admin:vastramapp_userloginhistory_changelist'),
+                                   {'q': 'meera', 'login_time__gte': since.isoformat()})
+        self.assertEqual(list(response.context['cl'].result_list), [recent])
+        response = self.client.get(reverse('admin:vastramapp_userloginhistory_changelist'), {'q': 'meera'})
+        self.assertCountEqual(response.context['cl'].result_list, [old, recent])
+
+
+
+class CheckoutTests(TestCase):
+    databases = {'default', 'logs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='pass12345')
+        category = Category.objects.create(name='Kurta')
+        cls.kurta, cls.saree = [
+            Product.objects.create(category=category, name=name, description=name, actual_price=900,
+                                   special_price=700, image='x.png', stock=stock)
+            for name, stock in (('Kurta', 2), ('Saree', 5))
+        ]
+
+    def fill_cart(self, *lines):
+        for product, quantity in lines:
+            Cart.objects.create(user=self.user, product=product, quantity=quantity)
+
+    def assertNothingChanged(self, cart):
+        self.assertEqual(dict(Product.objects.values_list('name', 'stock')), {'Kurta': 2, 'Saree': 5})
+        self.assertEqual(Product.objects.filter(sales_count__gt=0).count(), 0)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(list(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity')), cart)
+
+    def test_quantity_above_stock_is_rejected(self):
+        self.fill_cart((self.kurta, 3))
+        with self.assertRaises(OutOfStockError) as raised:
+            place_order(self.user, SHIPPING)
+        self.assertEqual(raised.exception.products, [self.kurta])
+        self.assertNothingChanged([(self.kurta.pk, 3)])
+
+    def test_short_line_rolls_back_the_others(self):
+        self.fill_cart((self.saree, 1), (self.kurta, 3))
+        with self.assertRaises(OutOfStockError):
+            place_order(self.user, SHIPPING)
+        self.assertNothingChanged([(self.saree.pk, 1), (self.kurta.pk, 3)])
+
+    def test_view_sends_buyer_back_to_cart(self):
+        self.fill_cart((self.kurta, 3))
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('checkout'), SHIPPING, follow=True)
+        self.assertRedirects(response, reverse('cart'))
+        self.assertContains(response, 'Not enough stock for: Kurta. Please update your cart and try again.')
+
+    def test_sell_out_bumps_catalog_version(self):
+        version = get_catalog_version()
+        self.fill_cart((self.saree, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, SHIPPING)
+        self.assertEqual(get_catalog_version(), version)  # still in stock
+
+        self.fill_cart((self.kurta, 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, SHIPPING)
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(Product.objects.get(pk=self.kurta.pk).stock, 0)
+
+
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Ethnic Wear')
+        make = lambda name, description: Product.objects.create(
+            category=cls.category, name=name, description=description, actual_price=900, special_price=900, image='x.png')
+        cls.kurta = make('Silk Kurta', 'Festive wear')
+        cls.dupatta = make('Cotton Dupatta', 'Pairs well with a silk kurta')
+        cls.shirt = make('Linen Shirt', 'Plain')
+
+    def ids(self, query):
+        return [pk for pk, score in search.search_product_ids(query, 10)]
+
+    def test_name_match_ranks_above_description_match(self):
+        self.assertEqual(self.ids('silk'), [self.kurta.pk, self.dupatta.pk])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.ids('dupat'), [self.dupatta.pk])
+        self.assertEqual(self.ids('ku'), [self.kurta.pk, self.dupatta.pk])
+        self.assertEqual(self.ids('silk ku'), [self.kurta.pk, self.dupatta.pk])  # every word must match
+        self.assertEqual(self.ids('silk shirt'), [])
+
+    def test_signals_keep_index_in_sync(self):
+        self.shirt.name = 'Khadi Shirt'
+        self.shirt.save()
+        self.assertEqual(self.ids('khadi'), [self.shirt.pk])
+        self.shirt.is_active = False
+        self.shirt.save()
+        self.assertEqual(self.ids('khadi'), [])
+
+        self.category.name = 'Handloom'
+        self.category.save()
+        self.assertEqual(self.ids('handloom'), [self.kurta.pk, self.dupatta.pk])
+
+        self.kurta.delete()
+        self.assertEqual(self.ids('silk'), [self.dupatta.pk])
+
+    def test_malformed_query_returns_nothing(self):
+        for query in ['', '"', '***', '(', '-']:
+            with self.subTest(query=query):
+                self.assertEqual(self.ids(query), [])
+        # Operators are quoted as plain words, never parsed
+        self.assertEqual(self.ids('silk" (kurta'), [self.kurta.pk, self.dupatta.pk])
+        response = self.client.get(reverse('search_products'), {'q': '"('})
+        self.assertContains(response, 'No products found')
+
+    def test_rebuild_is_all_or_nothing(self):
+        self.assertEqual(search.rebuild_index(), 3)
+        with mock.patch.object(search, 'POPULATE_SQL', 'INSERT INTO missing_table VALUES (1)'):
+            with self.assertRaises(OperationalError):
+                search.rebuild_index()
+        # The drop was rolled back along with the failed populate
+        self.assertEqual(self.ids('silk'), [self.kurta.pk, self.dupatta.pk])
+
+
+class ProductDiscountTests(TestCase):
+
+    def test_generated_discount_columns(self):
+        category = Category.objects.create(name='Kurta')
+        make = lambda actual, special: Product.objects.create(
+            category=category, name='Kurta', description='Kurta', actual_price=actual, special_price=special, image='x.png')
+        make(999, 333)
+        make(500, 600)
+        Product.objects.filter(actual_price=500).update(special_price=400)  # no save(), still recomputed
+        self.assertEqual(
+            list(Product.objects.order_by('-discount_amount').values_list('discount_amount', 'discount_percent')),
+            [(666, 66), (100, 20)],
+        )
+
+    def test_most_discounted_uses_index(self):
+        plan = Product.objects.filter(is_active=True, discount_amount__gt=0).order_by('-discount_amount')[:8].explain()
+        self.assertIn('product_active_discount_idx', plan)
+
+
+class ResponsiveImageTagTests(TestCase):
+
+    def render(self, product):
+        template = Template('{% load images %}{% responsive_image p.image sizes="25vw" alt=p.name %}')
+        return template.render(Context({'p': product}))
+
+    def test_plain_lazy_img_without_derivatives(self):
+        product = Product(name='Kurta', image='products/kurta.png')
+        html = self.render(product)
+        self.assertNotIn('<picture>', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_srcset_from_variants(self):
+        product = Product(name='Kurta', image='products/kurta.png', image_variants={
+            'source': 'products/kurta.png',
+            'width': 800,
+            'height': 600,
+            'formats': {'webp': [
+                ['derivatives/products/kurta-400w.webp', 400, 300],
+                ['derivatives/products/kurta-800w.webp', 800, 600],
+            ]},
+        })
+        html = self.render(product)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('/media/derivatives/products/kurta-400w.webp 400w, /media/derivatives/products/kurta-800w.webp 800w', html)
+        self.assertIn('sizes="25vw"', html)
+
+    def test_stale_variants_ignored(self):
+        product = Product(name='Kurta', image='products/new.png', image_variants={'source': 'products/old.png', 'formats': {}})
+        self.assertNotIn('<picture>', self.render(product))
+
+
+@skipUnless(features.check('webp'), 'Pillow built without WebP')
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, IMAGE_DERIVATIVE_FORMATS=('webp',))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.category = Category.objects.create(name='Kurta')
+
+    def upload(self, name, size=(500, 250)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, format='PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def make_product(self, image):
+        return Product.objects.create(category=self.category, name='Kurta', description='Kurta',
+                                      actual_price=900, special_price=900, image=image)
+
+    def test_variants_built_and_recorded(self):
+        name = self.upload('products/kurta.png')
+        with self.captureOnCommitCallbacks() as callbacks:
+            product = self.make_product(name)
+        self.assertEqual(len(callbacks), 1)  # queued for the worker after commit
+        version, updated_at = get_catalog_version(), product.updated_at
+
+        self.assertTrue(images.process_derivatives('vastramapp.Product', product.pk, 'image', name))
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {
+            'source': name, 'width': 500, 'height': 250,
+            'formats': {'webp': [
+                ['derivatives/products/kurta-200w.webp', 200, 100],
+                ['derivatives/products/kurta-400w.webp', 400, 200],
+                ['derivatives/products/kurta-500w.webp', 500, 250],
+            ]},
+        })
+        self.assertTrue(default_storage.exists('derivatives/products/kurta-200w.webp'))
+        # Only this product's pages move on; the rest of the site stays cached
+        self.assertGreater(product.updated_at, updated_at)
+        self.assertEqual(get_catalog_version(), version)
+
+        # Up to date, so saving again doesn't queue another job
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.save()
+        self.assertEqual(callbacks, [])
+
+    def test_newer_upload_not_overwritten(self):
+        old = self.upload('products/old.png')
+        product = self.make_product(old)
+        new = self.upload('products/new.png')
+        Product.objects.filter(pk=product.pk).update(image=new)
+        self.assertFalse(images.process_derivatives('vastramapp.Product', product.pk, 'image', old))
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+        self.assertEqual(product.image.name, new)
+
+
+class LoginHistoryTests(TestCase):
+    databases = {'default', 'logs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='pass12345')
+
+    @override_settings(LOGIN_HISTORY_ASYNC=False)
+    def test_login_records_history(self):
+        self.client.post(reverse('login'), {'username': 'shopper', 'password': 'pass12345'}, HTTP_USER_AGENT='test-agent')
+        entry = UserLoginHistory.objects.get(user=self.user)
+        self.assertEqual(entry.user_agent, 'test-agent')
+        self.assertEqual(entry._state.db, 'logs')
+
+    def test_deleting_user_removes_history_in_logs_db(self):
+        UserLoginHistory.objects.create(user=self.user, ip_address='10.0.0.1')
+        self.user.delete()
+        self.assertFalse(UserLoginHistory.objects.exists())
+
+    def test_spooled_events_are_replayed(self):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            writer = LoginHistoryWriter(spool_dir=spool_dir)
+            login_time = timezone.now() - timezone.timedelta(hours=1)
+            writer._spool([
+                {'user_id': self.user.pk, 'ip_address': '10.0.0.1', 'user_agent': 'a', 'device_id': 'd', 'login_time': login_time},
+                {'user_id': 999999, 'ip_address': '10.0.0.2', 'user_agent': 'b', 'device_id': 'e', 'login_time': login_time},
+            ])
+            writer._replay_spool()
+        # The event for the unknown user is dropped, the other keeps its time
+        entry = UserLoginHistory.objects.get()
+        self.assertEqual(entry.login_time, login_time)
+
+
+# Real commits: the writer thread has its own connection and has to see the user
+class LoginHistoryWriterTests(TransactionTestCase):
+    databases = {'default', 'logs'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper')
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool_dir = spool.name
+        self.writer = LoginHistoryWriter(batch_size=10, flush_interval=0.5, spool_dir=self.spool_dir)
+        self.addCleanup(self.writer.shutdown)
+
+    def record(self, count, start=0):
+        for n in range(start, start + count):
+            self.writer.record(user_id=self.user.pk, ip_address=f'10.0.0.{n}', user_agent='ua', device_id='d')
+
+    def signal_after(self, method):
+        """Patch a writer method to set an event once it has run."""
+        done = threading.Event()
+        real = getattr(self.writer, method)
+
+        def wrapper(events):
+            try:
+                return real(events)
+            finally:
+                done.set()
+        return done, mock.patch.object(self.writer, method, side_effect=wrapper)
+
+    def test_events_written_in_one_batch(self):
+        written, patch = self.signal_after('_bulk_insert')
+        with patch as insert:
+            self.record(3)
+            self.assertTrue(written.wait(5))
+        # Written by the background thread, all together
+        self.assertEqual(insert.call_count, 1)
+        self.assertEqual(len(insert.call_args.args[0]), 3)
+        self.assertEqual(UserLoginHistory.objects.using('logs').filter(user=self.user).count(), 3)
+
+        # Shutdown writes whatever is still queued
+        self.record(2, start=3)
+        self.writer.shutdown()
+        self.assertEqual(UserLoginHistory.objects.using('logs').count(), 5)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_failed_write_is_spooled_and_replayed(self):
+        spooled, patch = self.signal_after('_spool')
+        failure = OperationalError('database is locked')
+        with patch, mock.patch.object(self.writer, '_bulk_insert', side_effect=failure):
+            with self.assertLogs('vastramapp.login_history', 'ERROR'):
+                self.record(2)
+                self.assertTrue(spooled.wait(5))
+                self.writer.shutdown()
+        self.assertFalse(UserLoginHistory.objects.exists())
+        events = []
+        for name in os.listdir(self.spool_dir):
+            with open(os.path.join(self.spool_dir, name)) as f:
+                events += [json.loads(line)['ip_address'] for line in f]
+        self.assertEqual(sorted(events), ['10.0.0.0', '10.0.0.1'])
+
+        # The next writer to start picks them up
+        LoginHistoryWriter(spool_dir=self.spool_dir)._replay_spool()
+        self.assertEqual(UserLoginHistory.objects.count(), 2)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+
+class GuestCartTests(TestCase):
+    databases = {'default', 'logs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='pass12345')
+        category = Category.objects.create(name='Kurta')
+        cls.kurta, cls.saree = [
+            Product.objects.create(category=category, name=name, description=name, actual_price=900, special_price=700, image='x.png')
+            for name in ('Kurta', 'Saree')
+        ]
+        Cart.objects.create(user=cls.user, product=cls.kurta, quantity=1)
+
+    @override_settings(LOGIN_HISTORY_ASYNC=False)
+    def test_guest_cart_merged_at_login(self):
+        self.client.post(reverse('add_to_cart', args=[self.kurta.pk]))
+        self.client.post(reverse('add_to_cart', args=[self.saree.pk]))
+        self.assertFalse(Cart.objects.filter(product=self.saree).exists())  # still only in the session
+        self.assertContains(self.client.get(reverse('cart')), 'Saree')
+
+        self.client.post(reverse('login'), {'username': 'shopper', 'password': 'pass12345'})
+        self.assertEqual(
+            dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+            {self.kurta.pk: 2, self.saree.pk: 1},
+        )
+        self.assertNotIn('cart', self.client.session)
+
+    def test_guest_adds_from_product_page(self):
+        Product.objects.filter(pk=self.saree.pk).update(stock=5)
+        client = Client(enforce_csrf_checks=True)
+        page = client.get(reverse('product_detail', args=[self.saree.pk])).content.decode()
+        self.assertIn(f'action="{reverse("add_to_cart", args=[self.saree.pk])}"', page)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+
+        response = client.post(reverse('add_to_cart', args=[self.saree.pk]), {'csrfmiddlewaretoken': token})
+        self.assertRedirects(response, reverse('cart'))
+        self.assertEqual(client.session['cart'], {str(self.saree.pk): 1})
+
+    def test_bad_quantity_keeps_the_line(self):
+        self.client.post(reverse('add_to_cart', args=[self.saree.pk]))
+        url = reverse('update_cart_quantity', args=[self.saree.pk])
+        response = self.client.post(url, {'quantity': 'abc'}, follow=True)
+        self.assertContains(response, 'Please enter a valid quantity.')
+        self.client.post(url, {'quantity': '-3'})
+        self.assertEqual(self.client.session['cart'], {str(self.saree.pk): 1})
+
+    def test_cart_changes_need_post(self):
+        # A link or <img> on another site can't fill or empty a cart
+        self.assertEqual(self.client.get(reverse('add_to_cart', args=[self.saree.pk])).status_code, 405)
+        self.assertNotIn('cart', self.client.session)
+        self.client.post(reverse('add_to_cart', args=[self.saree.pk]))
+        self.assertEqual(self.client.get(reverse('remove_from_cart', args=[self.saree.pk])).status_code, 405)
+        self.assertEqual(self.client.session['cart'], {str(self.saree.pk): 1})
+
+        # The listing buttons are forms carrying the visitor's token, cached page or not
+        Product.objects.filter(pk=self.saree.pk).update(stock=5)
+        url = reverse('category_products', args=[self.saree.category_id])
+        for _ in range(2):
+            page = Client().get(url).content.decode()
+            self.assertIn(f'action="{reverse("add_to_cart", args=[self.saree.pk])}" method="post"', page)
+            self.assertIn('name="csrfmiddlewaretoken"', page)
+
+    def test_add_and_merge_keep_one_line_per_product(self):
+        cart = DatabaseCart(self.user)
+        cart.add(self.kurta)
+        session = self.client.session
+        session['cart'] = {str(self.kurta.pk): 2, str(self.saree.pk): 1}
+        merge_session_cart(session, self.user)
+        cart.add(self.saree)
+        self.assertEqual(
+            list(Cart.objects.filter(user=self.user).order_by('product_id').values_list('product_id', 'quantity')),
+            [(self.kurta.pk, 4), (self.saree.pk, 2)],
+        )
+
+
+class ConditionalGetTests(TestCase):
+    databases = {'default', 'logs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='pass12345')
+        category = Category.objects.create(name='Kurta')
+        cls.product = Product.objects.create(
+            category=category, name='Kurta', description='Kurta', actual_price=900, special_price=700, stock=5, image='x.png')
+
+    def test_product_detail_not_modified_until_stock_changes(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])  # the add-to-cart form's CSRF token
+        self.assertIn('Last-Modified', response)
+        self.assertIn('public', self.client.get(reverse('events'))['Cache-Control'])
+
+        with CaptureAllQueries() as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)  # just the validator
+        # ...which is a seek on the (category, updated_at) index, not a
+        # walk over the category
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + ctx.captured_queries[0]['sql'])
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('COVERING INDEX product_cat_updated_idx', plan)
+
+        etag = response['ETag']
+        self.product.decrease_stock(1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_varies_with_visitor(self):
+        url = reverse('home')
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)
+
+
+class AnonymousPageCacheTests(TestCase):
+    databases = {'default', 'logs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Kurta')
+        cls.product = Product.objects.create(
+            category=category, name='Kurta', description='Kurta', actual_price=900, special_price=700, stock=5, image='x.png')
+
+    def test_cached_page_gets_visitor_fragments(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        self.client.get(url)  # warm
+        self.client.post(reverse('add_to_cart', args=[self.product.pk]))  # message left pending
+
+        response = self.client.get(url)
+        rendered = [t.name for t in response.templates]
+        self.assertNotIn('product_detail.html', rendered)
+        self.assertIn('partials/messages.html', rendered)
+        self.assertContains(response, 'added to cart!')
+        self.assertContains(response, '<span class="navbar-cart-count">1</span>', html=True)
+        self.assertNotContains(response, '<!--hole:')
+
+    def test_stock_change_renders_fresh_page(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        self.assertContains(self.client.get(url), '5 available')
+        self.product.decrease_stock(2)
+        self.assertContains(self.client.get(url), '3 available')
+
+    def test_cached_guest_page_gets_fresh_csrf_token(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        add = reverse('add_to_cart', args=[self.product.pk])
+        self.client.get(url)  # warm
+        tokens = []
+        for _ in range(2):
+            guest = Client(enforce_csrf_checks=True)
+            response = guest.get(url)
+            self.assertNotIn('product_detail.html', [t.name for t in response.templates])
+            token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+            self.assertRedirects(guest.post(add, {'csrfmiddlewaretoken': token}), reverse('cart'))
+            tokens.append(token)
+        self.assertNotEqual(tokens[0], tokens[1])
+        # Another guest's token is no good
+        self.assertEqual(guest.post(add, {'csrfmiddlewaretoken': tokens[0]}).status_code, 403)
+
+
+class CatalogImportTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.images = os.path.join(self.tmp.name, 'images')
+        os.makedirs(self.images)
+        with open(os.path.join(self.images, 'kurta.png'), 'wb') as f:
+            f.write(b'png')
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(self.tmp.name, 'media')))
+
+    def write_catalog(self, name, lines):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_upserts_by_sku(self):
+        path = self.write_catalog('catalog.csv', [
+            'sku,name,category,actual_price,special_price,stock,image',
+            'K1,Kurta,Kurtas,999,799,5,kurta.png',
+            'K2,Saree,Sarees,1500,,2,kurta.png',
+            'K3,Broken,Kurtas,abc,,1,kurta.png',
+        ])
+        errors = []
+        stats = CatalogImporter(path, image_dir=self.images, batch_size=1, on_error=lambda n, m: errors.append(n)).run()
+        self.assertEqual((stats['created'], stats['errors'], errors), (2, 1, [3]))
+        saree = Product.objects.get(sku='K2')
+        self.assertEqual((saree.category.name, saree.special_price, saree.image.name), ('Sarees', 1500, 'products/kurta.png'))
+
+        # Second load updates in place and keeps the image when none is given
+        path = self.write_catalog('update.jsonl', ['{"sku": "K2", "name": "Silk saree", "category": "Sarees", "actual_price": "1400"}'])
+        stats = CatalogImporter(path, image_dir=self.images).run()
+        self.assertEqual(stats['updated'], 1)
+        saree.refresh_from_db()
+        self.assertEqual((saree.name, saree.actual_price, saree.image.name), ('Silk saree', 1400, 'products/kurta.png'))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write_catalog('catalog.csv', ['sku,name,category,actual_price,image'] + [
+            f'S{i},Shirt {i},Shirts,500,kurta.png' for i in range(5)
+        ])
+        importer = CatalogImporter(path, image_dir=self.images, batch_size=2)
+        importer.checkpoint.save(3, {'rows': 3, 'created': 3, 'updated': 0, 'errors': 0})
+        stats = importer.run()
+        # Rows 1-3 were committed by the "earlier" run
+        self.assertEqual(list(Product.objects.order_by('sku').values_list('sku', flat=True)), ['S3', 'S4'])
+        self.assertEqual(stats['created'], 5)
+        self.assertIsNone(importer.checkpoint.load())
+
+    def test_indexes_imported_rows_without_full_rebuild(self):
+        path = self.write_catalog('catalog.csv', [
+            'sku,name,category,actual_price,image,is_active',
+            'K1,Chanderi Kurta,Kurtas,999,kurta.png,true',
+            'K2,Hidden Kurta,Kurtas,999,kurta.png,false',
+        ])
+        with mock.patch.object(search, 'rebuild_index') as rebuild:
+            CatalogImporter(path, image_dir=self.images).run()
+        rebuild.assert_not_called()
+        ids = lambda query: [pk for pk, score in search.search_product_ids(query, 10)]
+        self.assertEqual(ids('chanderi'), [Product.objects.get(sku='K1').pk])
+        self.assertEqual(ids('hidden'), [])
+
+        with mock.patch.object(search, 'rebuild_index') as rebuild:
+            CatalogImporter(path, image_dir=self.images, full=True).run()
+        rebuild.assert_called_once_with()
+
+    def test_changed_image_replaced_in_place(self):
+        path = self.write_catalog('catalog.csv', ['sku,name,category,actual_price,image', 'K1,Kurta,Kurtas,999,kurta.png'])
+        CatalogImporter(path, image_dir=self.images).run()
+        Product.objects.update(image_variants={'source': 'products/kurta.png'})
+        for content in (b'new', b'newer png', b'newer png'):
+            with open(os.path.join(self.images, 'kurta.png'), 'wb') as f:
+                f.write(content)
+            CatalogImporter(path, image_dir=self.images).run()
+            with default_storage.open('products/kurta.png') as f:
+                self.assertEqual(f.read(), content)
+        # No _xxxxxxx copies, and the old derivatives are dropped
+        self.assertEqual(default_storage.listdir('products')[1], ['kurta.png'])
+        self.assertEqual(Product.objects.get().image_variants, {})
+
+
+class SalesRollupTests(TestCase):
+    databases = {'default', 'logs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        cls.category = Category.objects.create(name='Kurta', description='Kurtas')
+        cls.product = Product.objects.create(category=cls.category, name='Kurta', description='Kurta',
+                                             actual_price=1000, special_price=900, image='products/test.png', stock=50)
+
+    def place(self, quantity, status='pending', hours_ago=2):
+        order = Order.objects.create(user=self.user, total_amount=900 * quantity, status=status)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=900)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timezone.timedelta(hours=hours_ago))
+
+    def test_incremental_update(self):
+        self.place(2, hours_ago=3)
+        self.place(1, status='cancelled', hours_ago=3)
+        self.assertEqual(rollups.update_rollups(now=timezone.now() - timezone.timedelta(hours=2)), 1)
+        self.place(3, hours_ago=1)
+        self.place(1, hours_ago=0)  # too recent, picked up next run
+        self.assertEqual(rollups.update_rollups(), 1)
+
+        # Summed because the orders may straddle midnight
+        totals = DailySales.objects.aggregate(orders=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue'))
+        self.assertEqual(totals, {'orders': 2, 'units': 5, 'revenue': 4500})
+        self.assertEqual(DailyProductSales.objects.aggregate(units=Sum('units'))['units'], 5)
+        self.assertEqual(DailyCategorySales.objects.aggregate(revenue=Sum('revenue'))['revenue'], 4500)
+
+    def test_dashboard_reads_only_rollups(self):
+        self.place(2)
+        rollups.update_rollups()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:vastramapp_dailysales_changelist'), {'days': 7})
+        self.assertContains(response, '1800.00')
+        self.assertFalse([q for q in ctx.captured_queries if '"vastramapp_order' in q['sql']])
+
+
+class RecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Kurta')
+        cls.a, cls.b, cls.c, cls.d = [
+            Product.objects.create(category=category, name=name, description=name, actual_price=900,
+                                   special_price=900, image='products/test.png', stock=5)
+            for name in 'ABCD'
+        ]
+
+    def order(self, user, *products):
+        order = Order.objects.create(user=user, total_amount=900 * len(products))
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=900)
+
+    def neighbours(self, product):
+        return list(ProductRecommendation.objects.filter(product=product).order_by('rank')
+                    .values_list('recommended__name', flat=True))
+
+    def test_incremental_co_purchase(self):
+        # Cut off at the moment of each call, past the settle delay
+        now = lambda: timezone.now() + recommendations.settle_delay()
+        users = [User.objects.create_user(f'buyer{i}') for i in range(3)]
+        self.order(users[0], self.a, self.b)
+        self.order(users[1], self.a, self.b, self.c)
+        Wishlist.objects.create(user=users[2], product=self.a)
+        Wishlist.objects.create(user=users[2], product=self.d)
+        self.assertEqual(recommendations.update_recommendations(now=now()), (2, 4))
+        self.assertEqual(self.neighbours(self.a), ['B', 'C', 'D'])  # weights 4, 2, 1
+
+        # Only the new order is counted on the next run
+        self.order(users[0], self.c, self.d)
+        self.assertEqual(recommendations.update_recommendations(now=now()), (1, 2))
+        self.assertEqual(ProductCooccurrence.objects.get(product=self.a, other=self.b).weight, 4)
+        self.assertEqual(self.neighbours(self.d), ['C', 'A'])
+
+        response = self.client.get(reverse('product_detail', args=[self.a.pk]))
+        self.assertEqual([p.name for p in response.context['related_products']], ['B', 'C', 'D'])
+
+
+class ProductFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Saree')
+        # price, actual price, stock
+        for i, (price, actual, stock) in enumerate([(400, 400, 5), (450, 900, 0), (800, 1000, 3),
+                                                    (1500, 1500, 2), (2500, 5000, 1)]):
+            Product.objects.create(category=cls.category, name=f'Saree {i}', description='silk',
+                                   actual_price=actual, special_price=price, image='products/test.png', stock=stock)
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('category_products', args=[self.category.pk]), params)
+        return response, queries
+
+    def test_counts_in_one_query_and_exclude_own_selection(self):
+        response, queries = self.get(price='under-500')
+        facets = response.context['facets']
+        self.assertEqual(sum('AS "total"' in q['sql'] for q in queries.captured_queries), 1)
+        self.assertEqual(facets['total'], 2)
+        # Other price ranges still count as if picked instead
+        self.assertEqual([p['count'] for p in facets['prices']], [2, 1, 1, 1])
+        self.assertEqual([d['count'] for d in facets['discounts']], [1, 1, 1])  # Saree 1, 50% off
+        self.assertEqual(facets['in_stock']['count'], 1)
+        self.assertEqual([p.name for p in response.context['products']], ['Saree 1', 'Saree 0'])
+
+    def test_filters_combine_with_sort_and_cursor(self):
+        response, queries = self.get(in_stock='1', sort='price_low', bogus='x', discount='oops')
+        self.assertEqual([p.name for p in response.context['products']], ['Saree 0', 'Saree 2', 'Saree 3', 'Saree 4'])
+
+        # Keyset pages on the generated discount column
+        filters = ProductFilters({'in_stock': '1', 'sort': 'discount'})
+        products = filters.apply(Product.objects.filter(category=self.category, is_active=True))
+        first = paginate_queryset(products, filters.ordering, per_page=2)
+        self.assertEqual([p.name for p in first], ['Saree 4', 'Saree 2'])
+        second = paginate_queryset(products, filters.ordering, first.next_cursor, per_page=2)
+        self.assertEqual([p.name for p in second], ['Saree 3', 'Saree 0'])
+
+    def add_tied_saree(self):
+        return Product.objects.create(category=self.category, name='Saree 5', description='silk', actual_price=800,
+                                      special_price=800, image='products/test.png', stock=4)
+
+    def test_price_sorts_page_across_ties(self):
+        self.add_tied_saree()  # same price as Saree 2, so page 1 ends mid-tie
+        products = Product.objects.filter(category=self.category, is_active=True)
+        for sort, expected in [('price_low', ['Saree 0', 'Saree 1', 'Saree 2', 'Saree 5', 'Saree 3', 'Saree 4']),
+                               ('price_high', ['Saree 4', 'Saree 3', 'Saree 5', 'Saree 2', 'Saree 1', 'Saree 0'])]:
+            with self.subTest(sort=sort):
+                ordering = ProductFilters({'sort': sort}).ordering
+                first = paginate_queryset(products, ordering, per_page=3)
+                second = paginate_queryset(products, ordering, first.next_cursor, per_page=3)
+                self.assertEqual([p.name for p in first] + [p.name for p in second], expected)
+                self.assertFalse(second.has_next)
+                back = paginate_queryset(products, ordering, second.previous_cursor, per_page=3)
+                self.assertEqual([p.name for p in back], expected[:3])
+
+    def test_search_applies_filters_within_fts(self):
+        tied = self.add_tied_saree()
+        response = self.client.get(reverse('search_products'), {'q': 'silk', 'price': '500-1000'})
+        self.assertEqual([p.name for p in response.context['products']], ['Saree 2', 'Saree 5'])
+        self.assertEqual(response.context['facets']['total'], 2)
+        self.assertEqual([p['count'] for p in response.context['facets']['prices']], [2, 2, 1, 1])
+
+        # Ranked pages stay inside the filtered rows
+        filters = ProductFilters({'price': '500-1000', 'in_stock': '1'}, relevance=True)
+        within = filters.apply(Product.objects.filter(is_active=True))
+        first = search.search_page('silk', per_page=1, within=within)
+        second = search.search_page('silk', first.next_cursor, per_page=1, within=within)
+        self.assertEqual([pk for pk, score in first.items + second.items], [Product.objects.get(name='Saree 2').pk, tied.pk])
+        self.assertFalse(second.has_next)
+
+
+class SearchSuggestionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Silk Sarees')
+        for name, sales in [('Banarasi Silk Saree', 5), ('Silk Kurta', 40), ('Cotton Saree', 12), ('Sambalpuri Silk', 0)]:
+            Product.objects.create(category=cls.category, name=name, description=name, actual_price=900,
+                                   special_price=900, image='products/test.png', stock=5, sales_count=sales)
+
+    def setUp(self):
+        cache.clear()
+
+    def suggest(self, q, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('search_suggestions'), {'q': q, **params})
+        return [s['label'] for s in response.json()['suggestions']], len(queries)
+
+    def test_ranked_word_prefix_matches_without_queries(self):
+        self.suggest('warm up')
+        self.assertEqual(self.suggest('sil'), (['Silk Sarees', 'Silk Kurta', 'Banarasi Silk Saree', 'Sambalpuri Silk'], 0))
+        self.assertEqual(self.suggest('SAR', limit=2), (['Silk Sarees', 'Cotton Saree'], 0))
+        self.assertEqual(self.suggest('silk sa')[0], ['Silk Sarees', 'Banarasi Silk Saree'])
+        self.assertEqual(self.suggest('  ')[0], [])
+
+    def test_catalog_change_refreshes_index(self):
+        self.assertEqual(self.suggest('cot')[0], ['Cotton Saree'])
+        Product.objects.filter(name='Cotton Saree').get().delete()
+        self.assertEqual(self.suggest('cot')[0], [])
+
+    def test_sales_from_checkout_rerank_after_max_age(self):
+        self.assertEqual(self.suggest('sar')[0][:2], ['Silk Sarees', 'Cotton Saree'])
+        # Checkout's update() leaves the catalog version alone
+        Product.objects.filter(name='Banarasi Silk Saree').update(sales_count=100)
+        self.assertEqual(self.suggest('sar')[0][:2], ['Silk Sarees', 'Cotton Saree'])
+        suggest._index['index'].built_at -= suggest.INDEX_MAX_AGE
+        self.assertEqual(self.suggest('sar')[0][:2], ['Silk Sarees', 'Banarasi Silk Saree'])
+
+
+class SqliteProfileTests(TestCase):
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    @override_settings(SQLITE_LOCK_RETRIES=2)
+    def test_retry_on_locked(self):
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        # TestCase wraps each test in a transaction, which disables retries
+        with mock.patch.object(connection, 'in_atomic_block', False), self.assertLogs('vastramapp.db', 'WARNING') as logs:
+            self.assertEqual(write(), 'done')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(logs.records), 2)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
     path('category/<int:category_id>/', views.category_products, name='category_products'),
     path('search/', views.search_products, name='search_products'),
+    path('search/suggest/', views.search_suggestions, name='search_suggestions'),
     
     # Authentication
     path('signup/', views.signup_view, name='signup'),
@@ -16,8 +17,8 @@ urlpatterns = [
     # Cart
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
-    path('cart/remove/<int:cart_id>/', views.remove_from_cart, name='remove_from_cart'),
-    path('cart/update/<int:cart_id>/', views.update_cart_quantity, name='update_cart_quantity'),
+    path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/update/<int:product_id>/', views.update_cart_quantity, name='update_cart_quantity'),
     
     # Wishlist
     path('wishlist/', views.wishlist_view, name='wishlist'),
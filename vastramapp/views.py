@@ -1,14 +1,32 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, F
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Count, Max, Prefetch, Q, prefetch_related_objects
+from django.http import Http404, JsonResponse
 from django.utils import timezone
+from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_POST
+import logging
+import time
 import uuid
 from .models import *
 from .forms import SignUpForm
+from . import search, suggest
+from .pagination import paginate_queryset
+from .checkout import place_order, EmptyCartError, OutOfStockError
+from .login_history import record_login
+from .cart import get_cart
+from .conditional import conditional_page
+from .facets import RELEVANCE, ProductFilters
+from .page_cache import cache_anonymous_page
+from .cache import get_catalog_version, get_or_build, get_categories, HOME_CACHE_TIMEOUT
+from .cache import FINAL_ORDER_STATUSES, ORDER_SUMMARY_TIMEOUT, order_summary_key
+
+logger = logging.getLogger(__name__)
 
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -24,97 +42,173 @@ def track_user_login(request, user):
     ip_address = get_client_ip(request)
     device_id = f"{ip_address}-{hash(user_agent) % 10000}"
     
-    UserLoginHistory.objects.create(
-        user=user,
-        ip_address=ip_address,
-        user_agent=user_agent,
-        device_id=device_id
-    )
+    # Queued and bulk-inserted in the background, see login_history.py
+    record_login(user, ip_address, user_agent, device_id)
 
-def home(request):
-    categories = Category.objects.all()
+def _home_sections():
+    from datetime import timedelta
     
     # Dynamic Sliders
-    sliders = Slider.objects.filter(is_active=True).order_by('-created_at')[:4]
+    sliders = Slider.objects.filter(is_active=True).select_related('category').order_by('-created_at')[:4]
     
     # Featured Products - Most sold products
-    featured_products = Product.objects.filter(is_active=True).order_by('-sales_count')[:8]
+    featured_products = Product.objects.filter(is_active=True).select_related('category').order_by('-sales_count')[:8]
     
     # New Arrivals - Last 30 days products
-    from django.utils import timezone
-    from datetime import timedelta
     thirty_days_ago = timezone.now() - timedelta(days=30)
     new_arrivals = Product.objects.filter(
         is_active=True, 
         created_at__gte=thirty_days_ago
-    ).order_by('-created_at')[:8]
+    ).select_related('category').order_by('-created_at')[:8]
     
-    # Most Discounted Products - Fixed query
+    # Most Discounted Products - walks the (is_active, discount_amount) index
     most_discounted = Product.objects.filter(
         is_active=True,
-        actual_price__gt=F('special_price')
-    ).annotate(
-        discount_diff=F('actual_price') - F('special_price')
-    ).order_by('-discount_diff')[:8]
+        discount_amount__gt=0
+    ).select_related('category').order_by('-discount_amount')[:8]
     
     # Special Offers
     special_offers = SpecialOffer.objects.filter(is_active=True).order_by('-created_at')[:1]
     
+    # Evaluate everything here so the cached value holds rows, not querysets
+    return {
+        'categories': get_categories(),
+        'sliders': list(sliders),
+        'featured_products': list(featured_products),
+        'new_arrivals': list(new_arrivals),
+        'most_discounted': list(most_discounted),
+        'special_offers': list(special_offers),
+    }
+
+def _home_validators(request):
+    # The cached sections only change with the catalog version or when they
+    # expire; no query, so a warm home page stays query-free
+    return (get_catalog_version(), int(time.time() // HOME_CACHE_TIMEOUT)), None
+
+@conditional_page(_home_validators)
+@cache_anonymous_page
+def home(request):
+    # Served from the versioned catalog cache; signals.py bumps the version
+    # whenever a Product, Category, Slider or SpecialOffer changes
+    catalog_version = get_catalog_version()
+    context = get_or_build('home:sections', _home_sections, version=catalog_version)
+    
     return render(request, 'home.html', {
-        'categories': categories,
-        'sliders': sliders,
-        'featured_products': featured_products,
-        'new_arrivals': new_arrivals,
-        'most_discounted': most_discounted,
-        'special_offers': special_offers,
+        **context,
+        'catalog_version': catalog_version,
+        'home_cache_timeout': HOME_CACHE_TIMEOUT,
     })
 
+def _category_validators(category_ids):
+    # Stock changes go through update(), which sets updated_at explicitly;
+    # the catalog version covers deletions and the category nav
+    last_modified = Product.objects.filter(category_id__in=category_ids).aggregate(Max('updated_at'))['updated_at__max']
+    return (get_catalog_version(), last_modified), last_modified
+
+def _product_validators(request, product_id):
+    # The product and its related products share a category
+    return _category_validators(Product.objects.filter(id=product_id).values('category_id'))
+
+RELATED_LIMIT = 6
+
+@conditional_page(_product_validators)
+@cache_anonymous_page
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id, is_active=True)
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id, is_active=True)
     
-    # Get 6 latest products from the same category
-    related_products = Product.objects.filter(
-        category=product.category, 
+    # Bought/wishlisted together (recommendations.py), in rank order off the
+    # (product, rank) index
+    related_products = list(Product.objects.filter(
+        recommended_for__product=product,
         is_active=True
-    ).exclude(id=product.id).order_by('-created_at')[:6]
+    ).select_related('category').order_by('recommended_for__rank')[:RELATED_LIMIT])
+    if not related_products:
+        # No co-purchase data yet: 6 latest products from the same category
+        related_products = Product.objects.filter(
+            category=product.category, 
+            is_active=True
+        ).exclude(id=product.id).select_related('category').order_by('-created_at')[:RELATED_LIMIT]
     
     return render(request, 'product_detail.html', {
         'product': product,
         'related_products': related_products
     })
 
+def _category_page_validators(request, category_id):
+    return _category_validators([category_id])
+
+@conditional_page(_category_page_validators)
+@cache_anonymous_page
 def category_products(request, category_id):
     category = get_object_or_404(Category, id=category_id)
+    filters = ProductFilters(request.GET)
     products = Product.objects.filter(category=category, is_active=True)
+    # One aggregate for every facet count, then one keyset page of the filtered rows
+    facets = filters.counts(products)
+    page = paginate_queryset(filters.apply(products).select_related('category'), filters.ordering, request.GET.get('cursor'))
     return render(request, 'category_products.html', {
-        'products': products,
-        'categories': Category.objects.all(),
+        'products': page,
+        'page': page,
+        'facets': facets,
+        'categories': get_categories(request),
         'selected_category': category
     })
 
 def search_products(request):
-    query = request.GET.get('q')
-    products = Product.objects.filter(is_active=True)
+    query = request.GET.get('q', '').strip()
+    cursor = request.GET.get('cursor')
+    use_fts = bool(query) and search.is_available()
+    filters = ProductFilters(request.GET, default_sort=RELEVANCE if use_fts else 'newest', relevance=use_fts)
     
-    if query:
+    products = Product.objects.filter(is_active=True)
+    if use_fts:
+        products = products.filter(id__in=search.matching_ids(query))
+    elif query:
         products = products.filter(
             Q(name__icontains=query) | 
             Q(description__icontains=query) |
             Q(category__name__icontains=query)
         )
+    # Facets only for an actual search; counting the whole catalog would scan it
+    facets = filters.counts(products) if query else None
+    
+    if filters.sort == RELEVANCE:
+        # BM25-ranked ids from the FTS5 index, then one keyed fetch
+        page = search.search_page(query, cursor, within=filters.apply(products) if filters.active else None)
+        product_ids = [pk for pk, score in page.items]
+        found = Product.objects.filter(id__in=product_ids, is_active=True).select_related('category').in_bulk()
+        page.items = [found[pk] for pk in product_ids if pk in found]
+    else:
+        page = paginate_queryset(filters.apply(products).select_related('category'), filters.ordering, cursor)
     
     return render(request, 'search_result.html', {
-        'products': products,
-        'categories': Category.objects.all(),
+        'products': page,
+        'page': page,
+        'facets': facets,
+        'categories': get_categories(request),
         'search_query': query
     })
 
+# Short enough that a renamed or deactivated product drops out quickly
+SUGGESTIONS_MAX_AGE = 60
+
+@cache_control(public=True, max_age=SUGGESTIONS_MAX_AGE)
+def search_suggestions(request):
+    # Search-as-you-type; answered from the in-process index, no queries
+    query = request.GET.get('q', '')[:100]
+    try:
+        limit = max(1, min(int(request.GET.get('limit', suggest.DEFAULT_LIMIT)), suggest.MAX_LIMIT))
+    except ValueError:
+        limit = suggest.DEFAULT_LIMIT
+    return JsonResponse({'query': query, 'suggestions': suggest.get_index().suggest(query, limit)})
+
 def signup_view(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
         if form.is_valid():
             user = form.save()
             login(request, user)
+            track_user_login(request, user)
             messages.success(request, 'Account created successfully!')
             return redirect('home')
     else:
@@ -128,6 +222,7 @@ def login_view(request):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
+            track_user_login(request, user)
             messages.success(request, 'Logged in successfully!')
             return redirect('home')
         else:
@@ -139,20 +234,11 @@ def logout_view(request):
     messages.success(request, 'You have been logged out successfully!')
     return redirect('home')
 
+@require_POST
 def add_to_cart(request, product_id):
-    if not request.user.is_authenticated:
-        messages.warning(request, 'Please login to add items to cart!')
-        return redirect('login')
-    
-    product = get_object_or_404(Product, id=product_id)
-    cart_item, created = Cart.objects.get_or_create(
-        user=request.user,
-        product=product,
-        defaults={'quantity': 1}
-    )
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    # Guests get a session cart, merged into their account at login
+    product = get_object_or_404(Product, id=product_id, is_active=True)
+    get_cart(request).add(product)
     messages.success(request, f'{product.name} added to cart!')
     return redirect('cart')
 
@@ -189,29 +275,35 @@ def add_to_wishlist(request, product_id):
             messages.info(request, f'{product.name} is already in your wishlist!')
             return JsonResponse({'status': 'info', 'message': 'Already in wishlist!'})
 
-@login_required
-def remove_from_cart(request, cart_id):
-    cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
-    cart_item.delete()
+@require_POST
+def remove_from_cart(request, product_id):
+    cart = get_cart(request)
+    if product_id not in cart.contents():
+        raise Http404('Not in cart')
+    cart.remove(product_id)
     messages.success(request, 'Item removed from cart!')
     return redirect('cart')
 
-@login_required
-def update_cart_quantity(request, cart_id):
+def update_cart_quantity(request, product_id):
     if request.method == 'POST':
-        cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
-        quantity = int(request.POST.get('quantity', 1))
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-        else:
-            cart_item.delete()
+        cart = get_cart(request)
+        if product_id not in cart.contents():
+            raise Http404('Not in cart')
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except (TypeError, ValueError):
+            messages.error(request, 'Please enter a valid quantity.')
+            return redirect('cart')
+        if quantity < 1:
+            messages.warning(request, 'Quantity must be at least 1. Use Remove to take an item out of your cart.')
+            quantity = 1
+        cart.set_quantity(product_id, quantity)
     return redirect('cart')
 
-@login_required
 def cart_view(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    total_amount = sum(item.total_price() for item in cart_items)
+    cart = get_cart(request)
+    cart_items = cart.lines()
+    total_amount = cart.total(cart_items)
     return render(request, 'cart.html', {
         'cart_items': cart_items,
         'total_amount': total_amount
@@ -239,83 +331,80 @@ def wishlist_view(request):
 
 @login_required
 def checkout_view(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    if not cart_items:
+    cart = get_cart(request)
+    # Cached contents are enough to bounce an empty cart; the product lines
+    # are only built when the page is actually rendered
+    if not cart.count():
         messages.warning(request, 'Your cart is empty!')
         return redirect('cart')
     
-    total_amount = sum(item.total_price() for item in cart_items)
+    def render_checkout():
+        cart_items = cart.lines()
+        return render(request, 'checkout.html', {
+            'cart_items': cart_items,
+            'total_amount': cart.total(cart_items)
+        })
     
     if request.method == 'POST':
         # Shipping address data collect karo
-        full_name = request.POST.get('full_name')
-        phone = request.POST.get('phone')
-        address = request.POST.get('address')
-        city = request.POST.get('city')
-        state = request.POST.get('state')
-        pincode = request.POST.get('pincode')
+        shipping_data = {
+            field: request.POST.get(field)
+            for field in ('full_name', 'phone', 'address', 'city', 'state', 'pincode')
+        }
         
         # Validate required fields
-        if not all([full_name, phone, address, city, state, pincode]):
+        if not all(shipping_data.values()):
             messages.error(request, 'Please fill all the shipping information fields!')
-            return render(request, 'checkout.html', {
-                'cart_items': cart_items,
-                'total_amount': total_amount
-            })
+            return render_checkout()
         
         try:
-            # Shipping address create karo
-            shipping_address = ShippingAddress.objects.create(
-                user=request.user,
-                full_name=full_name,
-                phone=phone,
-                address=address,
-                city=city,
-                state=state,
-                pincode=pincode
-            )
-            
-            # Order create karo with unique ID
-            order = Order.objects.create(
-                user=request.user,
-                shipping_address=shipping_address,
-                total_amount=total_amount
-            )
-            
-            # Order items create karo with proper price
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.special_price  # Ensure price is set
-                )
-                # Update sales count
-                cart_item.product.sales_count += cart_item.quantity
-                cart_item.product.save()
-            
-            # Cart clear karo
-            cart_items.delete()
-            
-            messages.success(request, f'Order #{order.order_id} placed successfully!')
-            return redirect('order_history')
-            
-        except Exception as e:
-            messages.error(request, f'Error placing order: {str(e)}')
-            return render(request, 'checkout.html', {
-                'cart_items': cart_items,
-                'total_amount': total_amount
-            })
+            order = place_order(request.user, shipping_data)
+        except EmptyCartError:
+            messages.warning(request, 'Your cart is empty!')
+            return redirect('cart')
+        except OutOfStockError as e:
+            messages.error(request, f'{e}. Please update your cart and try again.')
+            return redirect('cart')
+        except DatabaseError:
+            # Still locked after place_order's retries, or similar; anything
+            # else is a bug and should surface as one
+            logger.exception('Placing an order for user %s failed', request.user.pk)
+            messages.error(request, 'We could not place your order right now. Please try again.')
+            return render_checkout()
+        
+        messages.success(request, f'Order #{order.order_id} placed successfully!')
+        return redirect('order_history')
     
-    return render(request, 'checkout.html', {
-        'cart_items': cart_items,
-        'total_amount': total_amount
-    })
+    return render_checkout()
+
+# Items with product and category in one query, only the columns the summary shows
+ORDER_ITEMS = Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product__category').only(
+    'order', 'quantity', 'price',
+    'product__name', 'product__image', 'product__image_variants', 'product__category__name',
+))
+
+def _attach_order_summaries(orders):
+    # Delivered/cancelled orders come from the cache; items are only fetched
+    # for the rest, all in one prefetch query
+    keys = {order.pk: order_summary_key(order) for order in orders if order.status in FINAL_ORDER_STATUSES}
+    cached = cache.get_many(list(keys.values()))
+    prefetch_related_objects([o for o in orders if keys.get(o.pk) not in cached], ORDER_ITEMS)
+    fresh = {}
+    for order in orders:
+        key = keys.get(order.pk)
+        order.summary = cached.get(key)
+        if order.summary is None:
+            order.summary = render_to_string('partials/order_summary.html', {'order': order})
+            if key:
+                fresh[key] = order.summary
+    cache.set_many(fresh, ORDER_SUMMARY_TIMEOUT)
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'order_history.html', {'orders': orders})
+    orders = Order.objects.filter(user=request.user).select_related('shipping_address', 'orderfeedback')
+    page = paginate_queryset(orders, ('-created_at', '-id'), request.GET.get('cursor'), per_page=10)
+    _attach_order_summaries(page.items)
+    return render(request, 'order_history.html', {'orders': page, 'page': page})
 
 @login_required
 @require_POST
@@ -366,6 +455,13 @@ def contact_us(request):
     
     return render(request, 'contact_us.html')
 
+def _events_validators(request):
+    # Count catches deletions, which leave the max timestamp alone
+    stats = Event.objects.aggregate(last_modified=Max('updated_at'), total=Count('id'))
+    return (get_catalog_version(), stats['last_modified'], stats['total']), stats['last_modified']
+
+@conditional_page(_events_validators)
+@cache_anonymous_page
 def events(request):
     events_list = Event.objects.filter(is_active=True).order_by('-event_date')
     return render(request, 'events.html', {'events': events_list})
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # ✅ ADD THIS LINE
+    'vastramapp.middleware.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,6 +71,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections (and their pragmas/page cache) across requests
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds to wait on the write lock before "database is locked"
+            'timeout': 20,
+            # Take the write lock at BEGIN. With the default DEFERRED mode a
+            # read-then-write transaction fails instantly when it can't upgrade,
+            # without ever waiting on the timeout above.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Login history, contact queries and sessions (see vastramapp.routers).
+    # Not in git; create it at deploy time with:
+    #   python manage.py migrate --database=logs
+    #   python manage.py copy_log_tables
+    'logs': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'logs.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['vastramapp.routers.LogDatabaseRouter']
+
+# Applied to every new SQLite connection by vastramapp.db.configure_sqlite.
+# WAL lets readers carry on while the single writer commits; NORMAL sync is
+# crash-safe in WAL mode (only the last commits can be lost on power failure).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative = KiB, so 64 MiB
+    'temp_store': 'memory',
+}
+# Extra attempts for write transactions that still hit a locked database
+SQLITE_LOCK_RETRIES = 3
+
+
+# Cache
+# Shared on-disk cache so catalog version bumps are seen by every gunicorn
+# worker; swap for memcached/redis once we run on more than one host.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 60 * 15,
     }
 }
 
@@ -128,4 +182,46 @@ LOGOUT_REDIRECT_URL = '/'
 
 # WhiteNoise settings
 WHITENOISE_USE_FINDERS = True
-WHITENOISE_MANIFEST_STRICT = False
\ No newline at end of file
+WHITENOISE_MANIFEST_STRICT = False
+
+# Request profiling (vastramapp.middleware.RequestProfilingMiddleware)
+PROFILING_SLOW_REQUEST_MS = 500
+PROFILING_SAMPLE_RATE = 1.0
+PROFILING_TOP_QUERIES = 5
+
+LOG_DIR = BASE_DIR / 'logs'
+os.makedirs(LOG_DIR, exist_ok=True)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timestamped': {
+            'format': '{asctime} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_DIR / 'slow_requests.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'timestamped',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'vastramapp.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Login history write-behind queue (vastramapp.login_history)
+LOGIN_HISTORY_ASYNC = True
+LOGIN_HISTORY_BATCH_SIZE = 100
+LOGIN_HISTORY_FLUSH_INTERVAL = 2.0
+LOGIN_HISTORY_SPOOL_DIR = BASE_DIR / 'spool'